@@ -0,0 +1,220 @@
+#RUN headless batches from here, e.g.
+#   python Batch.py "drawings/*.pdf" --scale 0.005 --workers 8 --output-dir annotated
+#   python Batch.py drawings --scale-table scales.csv --pages all
+import argparse
+import contextlib
+import csv
+import glob
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+
+def collect_pdfs(inputs):
+    # Each input is a directory, a single PDF or a glob pattern
+    pdf_paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "*.pdf")) + glob.glob(os.path.join(pattern, "*.PDF"))
+        else:
+            matches = glob.glob(pattern)
+        pdf_paths.extend(os.path.abspath(path) for path in matches if path.lower().endswith(".pdf"))
+
+    return sorted(set(pdf_paths))
+
+
+def read_scale_table(table_path):
+    # CSV with a file column (name or path of the PDF) and a scale column. A name applies to
+    # the PDF with that name, a path (relative to the working directory) to that one PDF.
+    scales = {}
+    with open(table_path, newline="") as f:
+        for row in csv.DictReader(f):
+            file = row["file"].strip()
+            scales[os.path.abspath(file) if os.path.dirname(file) else file] = float(row["scale"])
+    return scales
+
+
+def ambiguous_scale_names(scale_table, pdf_paths):
+    # Names in the scale table shared by several of the PDFs, which would all get that scale
+    counts = Counter(os.path.basename(path) for path in pdf_paths)
+    return sorted(name for name in scale_table if counts[name] > 1)
+
+
+def output_subdirs(pdf_paths):
+    # Where each file's output, log and trace go under the output directory: the folder of the
+    # PDF relative to the folder all the inputs share, so same-named PDFs from different folders
+    # do not overwrite each other (a single input folder writes straight into the output directory)
+    root = os.path.commonpath([os.path.dirname(path) for path in pdf_paths])
+    return {path: os.path.relpath(os.path.dirname(path), root) for path in pdf_paths}
+
+
+def load_manifest(manifest_path):
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return json.load(f)
+    return {"files": {}}
+
+
+def save_manifest(manifest, manifest_path):
+    # Write to a temporary file first so an interrupted run never leaves half a manifest
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def same_inputs(entry, pdf_path, scale_factor, pages, extraction, void_tile_size=None, pyramid=False):
+    return (
+        entry.get("scale_factor") == scale_factor
+        and entry.get("pages") == pages
+        and entry.get("extraction", "raster") == extraction  # manifests from before vector extraction
+        and entry.get("void_tile_size") == void_tile_size
+        and entry.get("pyramid", False) == pyramid
+        and entry.get("mtime") == os.path.getmtime(pdf_path)
+    )
+
+
+def run_job(pdf_path, scale_factor, pages, output_dir, trace_dir=None, extraction="raster", void_tile_size=None, pyramid=False, void_workers=1):
+    # Runs inside a worker process. Progress prints go to a per-file log instead of the console.
+    from Processor.Main_processor import process_pdf  # lazy import, keeps the parent light
+
+    os.makedirs(output_dir, exist_ok=True)
+    log_path = os.path.join(output_dir, os.path.basename(pdf_path)[:-4] + ".log")
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    with open(log_path, "w") as log, contextlib.redirect_stdout(log):
+        output_path, failed_pages = process_pdf(pdf_path, scale_factor, pages=None if pages == "first" else pages, workers=1, output_dir=output_dir, open_output=False, trace_dir=trace_dir, extraction=extraction, void_tile_size=void_tile_size, pyramid=pyramid, void_workers=void_workers)
+
+    return {
+        "output": os.path.abspath(output_path),
+        "failed_pages": failed_pages,
+        "log": os.path.abspath(log_path),
+        "seconds": round(time.perf_counter() - start_wall, 3),
+        "cpu_seconds": round(time.process_time() - start_cpu, 3),
+    }
+
+
+def run_batch(pdf_paths, scale_factor, scale_table, pages, output_dir, manifest_path, workers, retry_failed=False, trace_dir=None, extraction="raster", void_tile_size=None, pyramid=False, void_workers=None):
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(manifest_path)
+    entries = manifest["files"]
+
+    # -------- Work out what is left to do --------
+    subdirs = output_subdirs(pdf_paths) if pdf_paths else {}
+    jobs = []
+    for pdf_path in pdf_paths:
+        scale = scale_table.get(pdf_path, scale_table.get(os.path.basename(pdf_path), scale_factor))
+        if scale is None:
+            print(f"Skipping {pdf_path}: no scale factor given")
+            continue
+
+        # Skip files already finished with the same inputs (and whose output is still there),
+        # and files that failed with the same inputs unless asked to retry them
+        entry = entries.get(pdf_path)
+        if entry is not None and same_inputs(entry, pdf_path, scale, pages, extraction, void_tile_size, pyramid):
+            if entry["status"] == "done" and os.path.exists(entry.get("output", "")):
+                continue
+            if entry["status"] == "failed" and not retry_failed:
+                continue
+        jobs.append((pdf_path, scale))
+
+    print(f"{len(pdf_paths)} PDFs found, {len(pdf_paths) - len(jobs)} already processed or skipped, {len(jobs)} to run")
+    if not jobs:
+        return manifest
+
+    # -------- Run the jobs --------
+    # With fewer files than cores, the spare cores search the void tiles of each file
+    void_workers = void_workers or max(1, (os.cpu_count() or 1) // min(workers, len(jobs)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for pdf_path, scale in jobs:
+            entries[pdf_path] = {
+                "status": "running",
+                "scale_factor": scale,
+                "pages": pages,
+                "extraction": extraction,
+                "void_tile_size": void_tile_size,
+                "pyramid": pyramid,
+                "mtime": os.path.getmtime(pdf_path),
+                "started": datetime.now().isoformat(timespec="seconds"),
+            }
+            job_output_dir = os.path.normpath(os.path.join(output_dir, subdirs[pdf_path]))
+            job_trace_dir = os.path.normpath(os.path.join(trace_dir, subdirs[pdf_path])) if trace_dir else None
+            futures[pool.submit(run_job, pdf_path, scale, pages, job_output_dir, job_trace_dir, extraction, void_tile_size, pyramid, void_workers)] = pdf_path
+        save_manifest(manifest, manifest_path)
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            pdf_path = futures[future]
+            entry = entries[pdf_path]
+            entry["finished"] = datetime.now().isoformat(timespec="seconds")
+            try:
+                entry.update(future.result())
+                entry["status"] = "done"
+                entry.pop("error", None)
+                skipped = f", {len(entry['failed_pages'])} page(s) without a plan" if entry["failed_pages"] else ""
+                print(f"[{done}/{len(jobs)}] done   {os.path.basename(pdf_path)} ({entry['seconds']}s{skipped})")
+            except Exception as e:
+                entry["status"] = "failed"
+                entry["error"] = str(e)
+                print(f"[{done}/{len(jobs)}] FAILED {os.path.basename(pdf_path)}: {e}")
+
+            # Record every finished file straight away so an interrupted run can resume
+            save_manifest(manifest, manifest_path)
+
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Annotate a batch of slab plan PDFs with optimal rebar lines, without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories or glob patterns")
+    parser.add_argument("--scale", type=float, default=None, help="scale factor (real-world units per pixel at 300 dpi) used for every file")
+    parser.add_argument("--scale-table", help="CSV with 'file' (name or path) and 'scale' columns, overrides --scale per file")
+    parser.add_argument("--pages", choices=["first", "all"], default="first", help="which pages of each PDF to process")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of files processed in parallel")
+    parser.add_argument("--output-dir", default="annotated", help="where annotated PDFs, logs and the manifest are written")
+    parser.add_argument("--manifest", help="job manifest path (defaults to <output-dir>/manifest.json)")
+    parser.add_argument("--retry-failed", action="store_true", help="run files that failed in a previous run again")
+    parser.add_argument("--extraction", choices=["vector", "raster"], default="raster", help="recover beams and columns from the raster, or take them from the PDF drawing commands (falls back to the raster for scans and non-rectangular fills)")
+    parser.add_argument("--void-tile-size", type=int, default=None, help="search for voids in overlapping tiles of this many pixels (e.g. 4096); voids larger than the overlap can differ slightly")
+    parser.add_argument("--void-workers", type=int, default=None, help="processes searching the void tiles of each file (defaults to the cores left over by --workers)")
+    parser.add_argument("--pyramid", action="store_true", help="locate grey boxes and direction markers at low resolution first and only search around them at full resolution")
+    parser.add_argument("--cache-dir", help="where detection results are cached for re-runs (defaults to <output-dir>/cache)")
+    parser.add_argument("--no-cache", action="store_true", help="always run the full detection")
+    parser.add_argument("--trace", action="store_true", help="write per-stage timing and memory traces to <output-dir>/traces")
+    parser.add_argument("--artifacts", choices=["off", "thumbnails", "full"], default="off", help="write debug images to <output-dir>/artifacts")
+    args = parser.parse_args(argv)
+
+    if args.scale is None and args.scale_table is None:
+        parser.error("give a --scale or a --scale-table")
+
+    pdf_paths = collect_pdfs(args.inputs)
+    if not pdf_paths:
+        parser.error("no PDFs matched the given inputs")
+
+    scale_table = read_scale_table(args.scale_table) if args.scale_table else {}
+    ambiguous = ambiguous_scale_names(scale_table, pdf_paths)
+    if ambiguous:
+        parser.error(f"several PDFs are named {', '.join(ambiguous)}; give their paths in the scale table instead")
+
+    from Preprocessors.Helpers import artifacts
+    artifacts.configure(args.artifacts, os.path.join(args.output_dir, "artifacts"))
+
+    from Preprocessors.Helpers import stage_cache
+    stage_cache.configure(None if args.no_cache else args.cache_dir or os.path.join(args.output_dir, "cache"))
+    manifest_path = args.manifest or os.path.join(args.output_dir, "manifest.json")
+
+    trace_dir = os.path.join(args.output_dir, "traces") if args.trace else None
+
+    manifest = run_batch(pdf_paths, args.scale, scale_table, args.pages, args.output_dir, manifest_path, args.workers, args.retry_failed, trace_dir, args.extraction, args.void_tile_size, args.pyramid, args.void_workers)
+
+    failed = [path for path, entry in manifest["files"].items() if entry["status"] == "failed"]
+    if failed:
+        print(f"\n{len(failed)} file(s) failed, see {manifest_path}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,183 @@
+#RUN benchmarks from here, e.g.
+#   python Benchmark.py --sizes a4 a3 a2 --save-baseline benchmarks/baseline.json
+#   python Benchmark.py --baseline benchmarks/baseline.json
+import argparse
+import contextlib
+import json
+import math
+import os
+import re
+
+import fitz  # PyMuPDF
+
+import sample_diagram_generator as generator
+
+
+A4_AREA = fitz.paper_size("a4")[0] * fitz.paper_size("a4")[1]
+
+
+def build_corpus(corpus_dir, sizes, bays_per_a4=16, void_density=0.3, seed=0):
+    # One seeded plan per page size, with the number of bays growing with the page area
+    os.makedirs(corpus_dir, exist_ok=True)
+    plans = []
+    for page_size in sizes:
+        width, height = fitz.paper_size(page_size)
+        bays = max(1, round(bays_per_a4 * width * height / A4_AREA))
+        name = f"{page_size}_{bays}bays_seed{seed}"
+        path = os.path.join(corpus_dir, name + ".pdf")
+
+        # Plans are reproducible, so an existing file is reused as is
+        if not os.path.exists(path):
+            doc, _ = generator.generate_plan(seed, bays, void_density, page_size=page_size, markers=max(2, bays // 4))
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                generator.save_plan(doc, path[:-4])
+
+        plans.append({"name": name, "path": path, "page_size": page_size, "bays": bays})
+    return plans
+
+
+def stage_times(spans_path):
+    # Total wall time per stage, with "page N" spans folded into one "page" stage
+    with open(spans_path) as f:
+        spans = json.load(f)["spans"]
+
+    times = {}
+    for span in spans:
+        name = re.sub(r"^page \d+$", "page", span["name"])
+        times[name] = times.get(name, 0.0) + span["wall_ms"]
+    return times
+
+
+def run_plan(plan, scale_factor, repeat, work_dir):
+    # lazy imports, the corpus can be built without OpenCV
+    from Processor.Main_processor import process_pdf
+    from Preprocessors.Helpers import stage_cache
+
+    # Time the detectors, not reads of a cache inherited through REBAR_CACHE_DIR
+    stage_cache.configure(None)
+
+    trace_dir = os.path.join(work_dir, "traces")
+    best = {}
+    for _ in range(repeat):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            _, failed_pages = process_pdf(plan["path"], scale_factor, workers=1, output_dir=os.path.join(work_dir, "annotated"), open_output=False, trace_dir=trace_dir, extraction="raster")
+        if failed_pages:
+            # A skipped page would time as a fast one
+            raise RuntimeError(f"{plan['name']}: no plan found on page(s) {', '.join(str(failure['page']) for failure in failed_pages)}")
+
+        # Keep the fastest run of each stage, the least disturbed by the rest of the machine
+        for stage, ms in stage_times(os.path.join(trace_dir, plan["name"] + ".spans.json")).items():
+            best[stage] = min(ms, best.get(stage, ms))
+    return best
+
+
+def scaling_exponents(results):
+    # Least squares slope of log(time) over log(bays): ~1 is linear in the plan size, ~2 quadratic
+    exponents = {}
+    stages = {stage for result in results for stage in result["stages"]}
+    for stage in sorted(stages):
+        points = [(math.log(result["bays"]), math.log(result["stages"][stage]))
+                  for result in results if result["stages"].get(stage, 0) > 0]
+        if len(points) < 2:
+            continue
+        mean_x = sum(x for x, _ in points) / len(points)
+        mean_y = sum(y for _, y in points) / len(points)
+        var_x = sum((x - mean_x) ** 2 for x, _ in points)
+        if var_x > 0:
+            exponents[stage] = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+    return exponents
+
+
+def compare(results, baseline, tolerance=0.2, min_ms=10.0):
+    # Stages that got more than `tolerance` slower than the baseline on the same plan.
+    # Stages faster than min_ms in the baseline are too noisy to judge.
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = baseline_results.get(result["name"])
+        if old is None:
+            continue
+        for stage, ms in result["stages"].items():
+            old_ms = old["stages"].get(stage)
+            if old_ms is None or old_ms < min_ms:
+                continue
+            if ms > old_ms * (1 + tolerance):
+                regressions.append((result["name"], stage, old_ms, ms))
+    return regressions
+
+
+def print_table(results, exponents, baseline=None):
+    baseline_results = {result["name"]: result for result in baseline["results"]} if baseline else {}
+    stages = sorted({stage for result in results for stage in result["stages"]},
+                    key=lambda stage: -max(result["stages"].get(stage, 0) for result in results))
+
+    header = f"{'stage':<42}" + "".join(f"{result['name']:>24}" for result in results) + f"{'exponent':>10}"
+    print(header)
+    print("-" * len(header))
+    for stage in stages:
+        row = f"{stage:<42}"
+        for result in results:
+            ms = result["stages"].get(stage)
+            cell = "-" if ms is None else f"{ms:.1f}ms"
+            old = baseline_results.get(result["name"], {}).get("stages", {}).get(stage)
+            if ms is not None and old:
+                cell += f" ({ms / old:.2f}x)"
+            row += f"{cell:>24}"
+        exponent = exponents.get(stage)
+        row += f"{'' if exponent is None else f'{exponent:.2f}':>10}"
+        print(row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the full pipeline over a sweep of generated plans and report per-stage scaling.")
+    parser.add_argument("--sizes", nargs="+", default=["a4", "a3", "a2"], help="page sizes of the sweep, smallest first")
+    parser.add_argument("--bays-per-a4", type=int, default=16, help="bay density, scaled up with the page area")
+    parser.add_argument("--void-density", type=float, default=0.3, help="chance of a void in each bay")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per plan, the fastest is kept")
+    parser.add_argument("--scale", type=float, default=0.005, help="scale factor passed to the pipeline")
+    parser.add_argument("--work-dir", default="benchmarks", help="where the corpus, traces and results are written")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="slowdown counted as a regression (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", help="also write the results of this run here")
+    args = parser.parse_args(argv)
+
+    plans = build_corpus(os.path.join(args.work_dir, "corpus"), args.sizes, args.bays_per_a4, args.void_density, args.seed)
+
+    results = []
+    for plan in plans:
+        print(f"Running {plan['name']}....")
+        stages = run_plan(plan, args.scale, args.repeat, args.work_dir)
+        results.append({"name": plan["name"], "page_size": plan["page_size"], "bays": plan["bays"], "stages": stages})
+
+    exponents = scaling_exponents(results)
+    report = {"results": results, "exponents": exponents}
+    with open(os.path.join(args.work_dir, "results.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print()
+    print_table(results, exponents, baseline)
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        print()
+        if not regressions:
+            print(f"No stage regressed by more than {args.tolerance:.0%} against {args.baseline}")
+            return 0
+        for name, stage, old_ms, ms in regressions:
+            print(f"REGRESSION {name} {stage}: {old_ms:.1f}ms -> {ms:.1f}ms ({ms / old_ms:.2f}x)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,14 +1,14 @@
 import sys
-import os
-import fitz  # PyMuPDF
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QPushButton, QLabel, QFileDialog,
-    QVBoxLayout, QMessageBox, QTextEdit
+    QVBoxLayout, QMessageBox, QTextEdit, QCheckBox
 )
 from PyQt6.QtCore import QObject, pyqtSignal, QThread
 from PyQt6.QtGui import QIcon
 from .scale_calibration import ImageViewer
 from Processor.Main_processor import process_pdf
+from Preprocessors.Page_raster import load_page_raster
+from Preprocessors.Void_box_detector import VOID_TILE_SIZE
 
 
 
@@ -29,14 +29,17 @@ class ProcessorWorker(QObject):
     finished = pyqtSignal()
     error = pyqtSignal(str)
 
-    def __init__(self, file_path, scale_factor=None):
+    def __init__(self, file_path, scale_factor=None, raster=None, pages=None, void_tile_size=None):
         super().__init__()
         self.file_path = file_path
         self.scale_factor = scale_factor
+        self.raster = raster
+        self.pages = pages
+        self.void_tile_size = void_tile_size
 
     def run(self):
         try:
-            process_pdf(self.file_path, self.scale_factor)
+            process_pdf(self.file_path, self.scale_factor, raster=self.raster, pages=self.pages, void_tile_size=self.void_tile_size)
         except Exception as e:
             self.error.emit(str(e))
         finally:
@@ -53,6 +56,8 @@ class SimpleApp(QWidget):
         self.label = QLabel("Upload your PDF:", self)
         self.upload_btn = QPushButton("Browse", self)
         self.process_btn = QPushButton("Process", self)
+        self.all_pages_box = QCheckBox("Process all pages (scale calibrated on page 1)", self)
+        self.void_tiles_box = QCheckBox("Search for voids in tiles on all cores (large sheets, voids can differ slightly)", self)
         self.output_box = QTextEdit(self)
         self.output_box.setReadOnly(True)
 
@@ -62,6 +67,8 @@ class SimpleApp(QWidget):
         layout = QVBoxLayout()
         layout.addWidget(self.label)
         layout.addWidget(self.upload_btn)
+        layout.addWidget(self.all_pages_box)
+        layout.addWidget(self.void_tiles_box)
         layout.addWidget(self.process_btn)
         layout.addWidget(self.output_box)
         self.setLayout(layout)
@@ -73,6 +80,7 @@ class SimpleApp(QWidget):
         self.file_path = None
         self.thread = None
         self.scale_factor = None
+        self.raster = None
 
     def upload_file(self):
         file_path, _ = QFileDialog.getOpenFileName(
@@ -92,14 +100,9 @@ class SimpleApp(QWidget):
             QMessageBox.warning(self, "Invalid File", "Please upload a PDF file.")
             return
 
-        # Convert first page of PDF to image
+        # Render first page of PDF once; the same raster is reused for processing
         try:
-            doc = fitz.open(self.file_path)
-            pix = doc[0].get_pixmap(dpi=300)
-            os.makedirs("./resources", exist_ok=True)
-            image_path = "./resources/page1.png"
-            pix.save(image_path)
-            doc.close()
+            self.raster = load_page_raster(self.file_path)
             print("First page of PDF converted to image for calibration.")
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to convert PDF to image:\n{str(e)}")
@@ -111,7 +114,7 @@ class SimpleApp(QWidget):
         self.calibration_window.setGeometry(150, 150, 800, 600)
         instruction_label = QLabel("📝 Drag across a line with known distance to calibrate the scale.", self.calibration_window)
 
-        self.viewer = ImageViewer(image_path)
+        self.viewer = ImageViewer(self.raster.image)
         self.viewer.scale_calibrated.connect(self.start_processing_after_calibration)
 
         layout = QVBoxLayout()
@@ -131,7 +134,9 @@ class SimpleApp(QWidget):
         self.process_btn.setEnabled(False)
 
         self.thread = QThread()
-        self.worker = ProcessorWorker(self.file_path, self.scale_factor)
+        pages = "all" if self.all_pages_box.isChecked() else None
+        void_tile_size = VOID_TILE_SIZE if self.void_tiles_box.isChecked() else None
+        self.worker = ProcessorWorker(self.file_path, self.scale_factor, self.raster, pages, void_tile_size)
         self.worker.moveToThread(self.thread)
 
         self.thread.started.connect(self.worker.run)
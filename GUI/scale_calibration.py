@@ -1,24 +1,23 @@
 from PyQt6.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsLineItem, QInputDialog
-from PyQt6.QtGui import QPixmap, QPen
+from PyQt6.QtGui import QPixmap, QPen, QImage
 from PyQt6.QtCore import Qt
 from PyQt6.QtCore import pyqtSignal
 
 import cv2
-import os
 
 class ImageViewer(QGraphicsView):
     scale_calibrated = pyqtSignal(float)
 
-    def __init__(self, image_path):
+    def __init__(self, image):
         super().__init__()
         self.scene = QGraphicsScene(self)
         self.setScene(self.scene)
 
-        self.original_path = image_path
-        self.resized_path = "./resources/resized_page1.png"
-        self.resize_ratio = self.resize_image_for_qt(image_path, self.resized_path)
+        self.resized_image, self.resize_ratio = self.resize_image_for_qt(image)
+        h, w = self.resized_image.shape[:2]
+        qimage = QImage(self.resized_image.data, w, h, self.resized_image.strides[0], QImage.Format.Format_BGR888)
 
-        self.pixmap = QPixmap(self.resized_path)
+        self.pixmap = QPixmap.fromImage(qimage)
         if self.pixmap.isNull():
             print("Failed to load image.")
         else:
@@ -28,18 +27,12 @@ class ImageViewer(QGraphicsView):
         self.line_item = None
         self.scale_factor = None  # in real-world units per original pixel
 
-    def resize_image_for_qt(self, input_path, output_path, max_dim=2000):
-        img = cv2.imread(input_path)
+    def resize_image_for_qt(self, img, max_dim=2000):
         h, w = img.shape[:2]
         scale = max_dim / max(h, w)
         if scale < 1.0:
             img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
-            cv2.imwrite(output_path, img)
-        else:
-            # If no resizing needed, just copy the file
-            if input_path != output_path:
-                cv2.imwrite(output_path, img)
-        return 1.0 / scale if scale < 1.0 else 1.0  # resize_ratio = original / resized
+        return img, 1.0 / scale if scale < 1.0 else 1.0  # resize_ratio = original / resized
 
 
     def mousePressEvent(self, event):
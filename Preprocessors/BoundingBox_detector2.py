@@ -1,8 +1,21 @@
 import cv2
 import numpy as np
-import fitz  # PyMuPDF
 from collections import defaultdict
 import math
+from Preprocessors.Helpers import artifacts, colour_masks, tracing
+from Preprocessors.Helpers.contour_table import ContourTable
+
+# Pyramid mode (find_bounding_boxes(pyramid=True)): the grey boxes are first located on the
+# page shrunk by this factor, and only that part of the page is searched at full resolution
+PYRAMID_FACTOR = 4
+# How far the grey box morphology reaches (open 4 + close 30 + dilate/erode 6 + blur 2 px, rounded up)
+GREY_MASK_REACH = 64
+
+
+class NoPlanFound(ValueError):
+    # No slab plan on the page to annotate: no grey beam outlines, none big enough for a
+    # plan (a stray grey mark), or no slabs between them (a grey title block)
+    pass
 
 
 def get_enclosing_bounding_box(contours):
@@ -15,27 +28,27 @@ def get_enclosing_bounding_box(contours):
     # Return the top-left and bottom-right corners
     return (x, y), (x + w, y + h)
 
-def find_white_boxes_within_region(image, region_top_left, region_bottom_right):
+def find_white_boxes_within_region(roi, region_top_left):
+    """
+    The white boxes in roi, a grey view of the region that is overwritten: the threshold
+    and the morphology run in place on it, so no region-sized buffers are allocated.
+    region_top_left is where the view starts in the image; the boxes are returned as
+    (x1, y1, x2, y2) in image coordinates.
+    """
     x1, y1 = region_top_left
-    x2, y2 = region_bottom_right
-
-    # Crop the region of interest
-    roi = image[y1:y2, x1:x2]
 
-    # Convert to grayscale and threshold for white
-    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 180, 255, cv2.THRESH_BINARY)
+    # Threshold for white
+    cv2.threshold(roi, 180, 255, cv2.THRESH_BINARY, dst=roi)
 
     # Optional cleanup to remove small noise
     kernel = np.ones((4, 4), np.uint8)
-    cleaned = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, iterations=1)
-
+    cv2.morphologyEx(roi, cv2.MORPH_OPEN, kernel, dst=roi, iterations=1)
 
     merge_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (30, 30))  # adjust this size
-    cleaned = cv2.morphologyEx(cleaned, cv2.MORPH_CLOSE, merge_kernel)
+    cv2.morphologyEx(roi, cv2.MORPH_CLOSE, merge_kernel, dst=roi)
 
     # Find contours in the thresholded image
-    contours, _ = cv2.findContours(cleaned, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contours, _ = cv2.findContours(roi, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
     white_boxes = []
     for cnt in contours:
@@ -49,40 +62,7 @@ def find_white_boxes_within_region(image, region_top_left, region_bottom_right):
 
 
 
-def is_rectangle_like(contour, epsilon_factor=0.02, min_area=100):
-    # Approximate the contour
-    epsilon = epsilon_factor * cv2.arcLength(contour, True)
-    approx = cv2.approxPolyDP(contour, epsilon, True)
-
-    # Check if it's a quadrilateral and convex
-    if 4 <= len(approx) <= 6:
-        area = cv2.contourArea(approx)
-        if area > min_area:
-            return True
-    return False
-
-
-def find_grey_contours(img):
-    # -------- STEP 3: Mask for Grey Boxes --------
-    # Split B, G, R channels
-    b, g, r = cv2.split(img)
-
-    # Check where R, G, B are close to each other (grey condition)
-    diff_rg = cv2.absdiff(r, g)
-    diff_gb = cv2.absdiff(g, b)
-    diff_br = cv2.absdiff(b, r)
-
-    # Set a threshold for how "close" they should be (tune this!)
-    tolerance = 10
-    grey_mask = (diff_rg < tolerance) & (diff_gb < tolerance) & (diff_br < tolerance)
-
-    # Check brightness is between mid-range (to avoid black or white)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    brightness_mask = (gray > 50) & (gray <= 200)
-
-    # Combine both masks
-    final_mask = (grey_mask & brightness_mask).astype(np.uint8) * 255
-
+def clean_grey_mask(final_mask):
     # -------- STEP 4: Morphological Filtering --------
     # Optional cleanup to remove small noise
     kernel = np.ones((4, 4), np.uint8)
@@ -97,71 +77,82 @@ def find_grey_contours(img):
     closed = cv2.erode(dilated, kernel, iterations=2)
 
     cleaned = cv2.GaussianBlur(closed, (5,5), 0)
+    return cleaned
+
 
+def grey_mask_contours(cleaned):
     # -------- STEP 5: Find Contours (Grey Box Outlines) --------
-    contours, _ = cv2.findContours(cleaned, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    # As a ContourTable with the hierarchy
+    contours, hierarchy = cv2.findContours(cleaned, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
     if not contours:
-        raise ValueError("No contours found in the image. Please check that you have uploaded the correct file.")
-
-    # Draw all contours
-    # img_with_contours = img.copy()
-    # cv2.drawContours(img_with_contours, contours, -1, (255,0,0),2)
-    # cv2.imwrite('./resources/contours_output.png', img_with_contours)
-    return contours
-
-
-
-
-def find_black_boxes(img, enclosing_box, solidity_thresh=0.5, fill_ratio_thresh=0.5):
-    x0, y0 = enclosing_box[0]
-    x1, y1 = enclosing_box[1]
-
-    # Crop the region of interest
-    roi = img[y0:y1, x0:x1]
-
-    # Convert to grayscale and apply fixed thresholding
-    gray_roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-    _, binary_mask = cv2.threshold(gray_roi, 50, 255, cv2.THRESH_BINARY_INV)
-    
-    # Morphological operations to clean up noise
-    # kernel = np.ones((3, 3), np.uint8)
-    # binary_mask = cv2.morphologyEx(binary_mask, cv2.MORPH_OPEN, kernel, iterations=1)
-
-
-    # # Save the binary mask for debugging
-    # cv2.imwrite("black_box_processing_fixed_threshold.png", binary_mask)
-
-    # Find contours in the binary mask
-    black_contours, _ = cv2.findContours(binary_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    # black_cont = roi.copy()
-    # cv2.drawContours(black_cont, black_contours, -1, (255, 0, 0), thickness=2)
-    # cv2.imwrite("black_contours.png", black_cont)
-
-    # Filter and map contours back to original image coordinates
-    black_boxes = []
-    for cnt in black_contours:
-        area = cv2.contourArea(cnt)
-
-        # Solidity
-        hull = cv2.convexHull(cnt)
-        hull_area = cv2.contourArea(hull)
-        solidity = float(area) / hull_area if hull_area > 0 else 0
+        raise NoPlanFound("No contours found in the image. Please check that you have uploaded the correct file.")
+    return ContourTable(contours, hierarchy)
+
+
+def locate_grey_window(img, factor=PYRAMID_FACTOR, margin=2 * GREY_MASK_REACH):
+    """
+    Coarse pass of pyramid mode: the part of the page holding the grey boxes, found on a
+    copy shrunk by `factor`. Returns (x0, y0, x1, y1) in page pixels, padded by `margin`,
+    or None if no grey is found.
+    """
+    # Every factor-th pixel, not an average: text shrunk by averaging turns into grey blobs
+    small = cv2.resize(img, None, fx=1 / factor, fy=1 / factor, interpolation=cv2.INTER_NEAREST)
+    _, grey_mask, _ = colour_masks.classify_colours(small)
+
+    # Anti-aliased edges are grey but a pixel or two wide, so they leave thin streaks at most,
+    # while a solid grey area of 3 * factor pixels a side (less than the 20 px filter_contours
+    # keeps) leaves a 3x3 block
+    grey_mask = cv2.morphologyEx(grey_mask, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+    points = cv2.findNonZero(grey_mask)
+    if points is None:
+        return None
+
+    x, y, w, h = cv2.boundingRect(points)
+    height, width = img.shape[:2]
+    return (max(x * factor - margin, 0), max(y * factor - margin, 0),
+            min((x + w) * factor + margin, width), min((y + h) * factor + margin, height))
+
+
+def grey_contours_in_window(img, window):
+    """
+    Fine pass of pyramid mode: classify_colours and the grey box contours of img inside
+    window, in window coordinates.
+
+    Returns (gray, dark_mask, grey_contours), or None if no grey box is found or one may
+    reach past the window: grey left by the 4x4 opening of clean_grey_mask within
+    GREY_MASK_REACH of a side that is not the page edge. Otherwise the grey box mask inside
+    the window is the same as on the whole page.
+    """
+    x0, y0, x1, y1 = window
+    gray, grey_mask, dark_mask = colour_masks.classify_colours(img[y0:y1, x0:x1])
+
+    height, width = img.shape[:2]
+    reach = GREY_MASK_REACH
+    bands = []
+    if x0 > 0:
+        bands.append(grey_mask[:, :reach])
+    if x1 < width:
+        bands.append(grey_mask[:, -reach:])
+    if y0 > 0:
+        bands.append(grey_mask[:reach])
+    if y1 < height:
+        bands.append(grey_mask[-reach:])
+    kernel = np.ones((4, 4), np.uint8)
+    for band in bands:
+        if cv2.countNonZero(cv2.morphologyEx(band, cv2.MORPH_OPEN, kernel)):
+            return None
 
-        # Fill ratio
-        x, y, w, h = cv2.boundingRect(cnt)
-        roi_box = binary_mask[y:y+h, x:x+w]
-        bounding_box_area = w * h
-        fill_ratio = cv2.countNonZero(roi_box) / bounding_box_area if bounding_box_area > 0 else 0
+    try:
+        grey_contours = grey_mask_contours(clean_grey_mask(grey_mask))
+    except NoPlanFound:
+        return None
+    return gray, dark_mask, grey_contours
 
-        if area > 500 and solidity > solidity_thresh and fill_ratio > fill_ratio_thresh:
-            cnt[:, 0, 0] += x0  # shift x
-            cnt[:, 0, 1] += y0  # shift y
-            black_boxes.append(cnt)
 
+def axis_aligned_boxes(contours):
     # Convert contours to axis-aligned rectangles
     final_boxes = []
-    for cnt in black_boxes:
+    for cnt in contours:
         rect = cv2.minAreaRect(cnt)
         (cx, cy), (w, h), angle = rect
         if abs(angle) < 10 or abs(angle - 90) < 10:
@@ -174,49 +165,106 @@ def find_black_boxes(img, enclosing_box, solidity_thresh=0.5, fill_ratio_thresh=
     return final_boxes
 
 
+def outer_component_labels(binary_mask, labels):
+    # Labels of the blobs findContours(RETR_EXTERNAL) gives an outline for: the ones next to the
+    # background that reaches the image edge. Blobs inside the holes of other blobs are left out.
+    padded = cv2.copyMakeBorder(binary_mask, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+    cv2.floodFill(padded, None, (0, 0), 128)  # 4-connected, like the background findContours sees
+    outside = cv2.compare(padded, 128, cv2.CMP_EQ)
+    near_outside = cv2.dilate(outside, cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3)))[1:-1, 1:-1]
+    return np.unique(labels[(near_outside != 0) & (binary_mask != 0)])
+
+
+def find_black_boxes(img, enclosing_box, solidity_thresh=0.5, fill_ratio_thresh=0.5, min_area=500):
+    """
+    The solid dark (< 50) blobs inside enclosing_box, as axis-aligned box corners: blobs with
+    an outline enclosing more than min_area pixels, a solidity above solidity_thresh and
+    dark pixels filling more than fill_ratio_thresh of their bounding box. In the order
+    findContours(RETR_EXTERNAL) lists their outlines.
+
+    connectedComponentsWithStats gives the bounding box of every blob in one call. A blob's
+    outline encloses at most (w - 1) * (h - 1) pixels, so blobs that cannot pass the area
+    check are dropped before anything else, and the rest before any contour work if their
+    fill ratio is too low. Only the rest are traced, on a crop of their own, and go through
+    the exact area, solidity and fill ratio checks.
+    """
+    x0, y0 = enclosing_box[0]
+    x1, y1 = enclosing_box[1]
 
-def filter_contours(contours, min_area, min_width, min_height, rectangle_check = False):
-    filtered_contours = []
-    rejected = []
-
-    for cnt in contours:
-        area = cv2.contourArea(cnt)
-        x, y, w, h = cv2.boundingRect(cnt)
-        is_rect = is_rectangle_like(cnt) if rectangle_check else True
-
-
-        if area > min_area and  w > min_width and h > min_height and is_rect:
-            # epsilon = 0.0001 * cv2.arcLength(cnt, True)
-            # approx = cv2.approxPolyDP(cnt, epsilon, True)
-            # filtered_contours.append(approx)
-            filtered_contours.append(cnt)
-        elif not is_rectangle_like(cnt):
-            rejected.append(cnt)
-    return filtered_contours, rejected
-
-
-def whiten_black_pixels(img, tolerance = 150, brightness_threshold = 150):
-    # Convert to grayscale to simplify brightness analysis
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-    # Define a mask for "remotely grey" pixels
-    # These are pixels where R ≈ G ≈ B and brightness is low (dark grey)
-
-    b, g, r = cv2.split(img)
-    diff_rg = cv2.absdiff(r, g)
-    diff_gb = cv2.absdiff(g, b)
-    diff_br = cv2.absdiff(b, r)
-
-    grey_mask = (diff_rg < tolerance) & (diff_gb < tolerance) & (diff_br < tolerance)
-    dark_mask = gray < brightness_threshold
-
-    # Combine masks
-    remotely_grey_mask = grey_mask & dark_mask
-
-    # Apply the mask to set those pixels to white
-    img[remotely_grey_mask] = [255, 255, 255]
+    # Crop the region of interest
+    roi = img[y0:y1, x0:x1]
 
+    # Convert to grayscale (unless already a single channel plane) and apply fixed thresholding
+    gray_roi = roi if roi.ndim == 2 else cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    _, binary_mask = cv2.threshold(gray_roi, 50, 255, cv2.THRESH_BINARY_INV)
 
+    # -------- STEP 1: Stats of every blob (8-connected, like findContours) --------
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(binary_mask, connectivity=8)
+    xs, ys = stats[1:, cv2.CC_STAT_LEFT], stats[1:, cv2.CC_STAT_TOP]
+    ws, hs = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT]
+
+    bounding_box_area = ws.astype(np.int64) * hs
+
+    # -------- STEP 2: Drop the blobs that cannot pass --------
+    big = np.nonzero((ws - 1).astype(np.int64) * (hs - 1) > min_area)[0]
+
+    # Dark pixels (of any blob) in the bounding box of each blob big enough. Counted per box
+    # rather than from an integral image, which would take 4 bytes per pixel of the region.
+    dark = np.zeros(len(ws), np.int64)
+    for i in big:
+        dark[i] = cv2.countNonZero(binary_mask[ys[i]:ys[i] + hs[i], xs[i]:xs[i] + ws[i]])
+
+    candidates = big[dark[big] > fill_ratio_thresh * bounding_box_area[big]] + 1
+    if len(candidates) == 0:
+        return []
+
+    # A blob inside another blob's bounding box may sit in one of its holes
+    inside_other = []
+    for label in candidates:
+        x, y, w, h = stats[label, :4]
+        contains = (xs <= x) & (ys <= y) & (xs + ws >= x + w) & (ys + hs >= y + h)
+        inside_other.append(contains.sum() > 1)
+    if any(inside_other):
+        candidates = np.intersect1d(candidates, outer_component_labels(binary_mask, labels))
+
+    # findContours lists the outlines last found first, in raster order of their first pixel
+    starts = []
+    for label in candidates:
+        x, y = stats[label, cv2.CC_STAT_LEFT], stats[label, cv2.CC_STAT_TOP]
+        starts.append((y, x + np.argmax(labels[y, x:] == label)))
+    candidates = [label for _, label in sorted(zip(starts, candidates), reverse=True)]
+
+    # -------- STEP 3: Exact checks on the outlines of the rest --------
+    outlines = []
+    for label in candidates:
+        x, y, w, h = stats[label, :4]
+        blob = cv2.compare(labels[y:y + h, x:x + w], int(label), cv2.CMP_EQ)
+        blob = cv2.copyMakeBorder(blob, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+        contours, _ = cv2.findContours(blob, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        cnt = contours[0]
+        cnt[:, 0, 0] += x - 1 + x0  # shift x
+        cnt[:, 0, 1] += y - 1 + y0  # shift y
+        outlines.append(cnt)
+
+    table = ContourTable(outlines)
+    candidates = np.array(candidates, dtype=np.int64)
+    fill_ratio = dark[candidates - 1] / bounding_box_area[candidates - 1]
+    keep = np.nonzero((table.areas > min_area) & (fill_ratio > fill_ratio_thresh))[0]
+    keep = keep[table.solidity(keep) > solidity_thresh]
+    black_boxes = table.subset(keep)
+
+    return axis_aligned_boxes(black_boxes)
+
+
+
+def filter_contours(table, min_area, min_width, min_height, rectangle_check = False):
+    # Indices of the contours of a ContourTable bigger than min_area, min_width and min_height
+    # (and rectangle like, with rectangle_check)
+    _, _, w, h = table.bboxes.T
+    keep = np.nonzero((table.areas > min_area) & (w > min_width) & (h > min_height))[0]
+    if rectangle_check:
+        keep = keep[table.rectangle_like(keep)]
+    return keep
 
 
 def cut_side_boxes(enclosing_box, boxes):
@@ -236,42 +284,43 @@ def cut_side_boxes(enclosing_box, boxes):
 
 
 
-
-
-
-
-
-
-
-
-
-def find_bounding_boxes(pdf_path):
+def find_bounding_boxes(raster, pyramid = False):
+    # pyramid: locate the grey boxes on a shrunk copy of the page first and only search that
+    # part of it at full resolution (locate_grey_window / grey_contours_in_window)
 
     # FIND BOUNDING BOXES! -----------------------------------------------------------------------------
     print("\nFinding bounding boxes...")
 
-    # -------- STEP 1: Save Image --------
-    doc = fitz.open(pdf_path)
-
-    # Get the first page and render as image
-    page = doc[0]
-    pix = page.get_pixmap(dpi=300)  # can adjust dpi
-
-    # Save as PNG
-    pix.save("./resources/page1.png")
-
-
-    # -------- STEP 2: Read Image and Find Grey Contours --------
-    img = cv2.imread("./resources/page1.png")
-    # cv2.imwrite("./resources/page1.png", img)
+    # -------- STEP 1 & 2: Take the rendered page and Find Grey Contours --------
+    img = raster.image
+    # Everything below is in the coordinates of the searched window, which starts here on the page
+    origin = (0, 0)
 
     #find grey contours in the image
     print("Finding grey boxes...")
-    grey_contours = find_grey_contours(img)
+    with tracing.span("find_grey_contours") as span:
+        found = None
+        if pyramid:
+            window = locate_grey_window(img)
+            found = grey_contours_in_window(img, window) if window else None
+            if found is None:
+                print("Grey boxes not confined to one window, searching the whole page")
+            else:
+                x0, y0, x1, y1 = window
+                origin = (x0, y0)
+                span.count(window_pixels=(x1 - x0) * (y1 - y0))
+
+        if found is None:
+            # Grey box and dark grey masks of the page in one pass (colour_masks.classify_colours)
+            gray, grey_mask, dark_mask = colour_masks.classify_colours(img)
+            grey_contours = grey_mask_contours(clean_grey_mask(grey_mask))
+        else:
+            gray, dark_mask, grey_contours = found
+        span.count(contours=len(grey_contours))
     
     # Draw contours
-    grey_imgs = img.copy()
-    cv2.drawContours(grey_imgs, grey_contours, -1, (0, 0, 255), 2)  # -1 means draw all contours
+    # grey_imgs = img.copy()
+    # cv2.drawContours(grey_imgs, grey_contours, -1, (0, 0, 255), 2)  # -1 means draw all contours
     #cv2.imwrite("grey_boxes.png", grey_imgs)
 
     # -------- STEP 3: Filter the small Contours and find the enclosing box --------
@@ -279,8 +328,11 @@ def find_bounding_boxes(pdf_path):
     min_width = 20
     min_height = 20
 
-    filtered_grey_boxes, _ = filter_contours(grey_contours, min_area, min_width, min_height)
-    enclosing_box = get_enclosing_bounding_box(filtered_grey_boxes)
+    keep = filter_contours(grey_contours, min_area, min_width, min_height)
+    if len(keep) == 0:
+        raise NoPlanFound("No grey boxes big enough for a slab plan. Please check that you have uploaded the correct file.")
+    filtered_grey_boxes = grey_contours.subset(keep)
+    enclosing_box = grey_contours.enclosing_box(keep)
     # cont = img.copy()
     # cv2.drawContours(cont, filtered_grey_boxes, -1, (255, 0, 0), thickness=2)
     # # cv2.imwrite("contours.png", cont)
@@ -289,43 +341,65 @@ def find_bounding_boxes(pdf_path):
 
     # -------- STEP 4: Detect Black Boxes Within Enclosing Box --------
     print("Finding black boxes...")
-    black_boxes = find_black_boxes(img, enclosing_box)
+    with tracing.span("find_black_boxes") as span:
+        black_boxes = find_black_boxes(gray, enclosing_box)
+        span.count(boxes=len(black_boxes))
 
 
     min_area = 400  # adjust this threshold as needed (e.g. 1000–3000)
     min_width = 20
     min_height = 20
     
-    filtered_black_boxes, _ = filter_contours(black_boxes, min_area, min_width, min_height, rectangle_check = True)
+    black_boxes = ContourTable(black_boxes)
+    filtered_black_boxes = black_boxes.subset(filter_contours(black_boxes, min_area, min_width, min_height, rectangle_check = True))
 
 
-    # Draw black boxes on the image
-    contour_img = img.copy()
-    whiten_black_pixels(contour_img)
+    # -------- STEP 5: Mask the grey and black boxes inside the enclosing box --------
+    # Everything below works on a view of the enclosing box in a whitened grey plane nothing
+    # else reads any more, painted and thresholded in place: no copy of the page is made.
+    # (0,255,0) is 150 in grey, the value the colour version of this step thresholded.
+    # The grey plane of classify_colours, done with since find_black_boxes
+    (ex1, ey1), (ex2, ey2) = enclosing_box
+    roi = gray[ey1:ey2, ex1:ex2]
+    colour_masks.whiten(roi, dark_mask[ey1:ey2, ex1:ex2])
 
-    cv2.drawContours(contour_img, filtered_grey_boxes, -1, (0, 0, 0), thickness=-1)
-    cv2.drawContours(contour_img, filtered_black_boxes, -1, (0, 0, 0), thickness=-1)
-    cv2.drawContours(contour_img, filtered_black_boxes, -1, (0, 0, 0), thickness=20)
+    offset = (-ex1, -ey1)
+    cv2.drawContours(roi, filtered_grey_boxes, -1, 0, thickness=-1, offset=offset)
+    cv2.drawContours(roi, filtered_black_boxes, -1, 0, thickness=-1, offset=offset)
+    cv2.drawContours(roi, filtered_black_boxes, -1, 0, thickness=20, offset=offset)
 
-    cv2.rectangle(contour_img, enclosing_box[0], enclosing_box[1], (0,255,0), 2)
+    cv2.rectangle(roi, (0, 0), (ex2 - ex1, ey2 - ey1), 150, 2)
+
+    # The white box search overwrites the view, and artifacts are written later on
+    contour_img = roi.copy() if artifacts.enabled() else None
 
     print("Finding white boxes...")
-    boxes = find_white_boxes_within_region(contour_img, enclosing_box[0], enclosing_box[1])
+    with tracing.span("find_white_boxes") as span:
+        boxes = find_white_boxes_within_region(roi, enclosing_box[0])
+        span.count(white_boxes=len(boxes))
 
-    boxes = cut_side_boxes(enclosing_box, boxes)
+        boxes = cut_side_boxes(enclosing_box, boxes)
+        span.count(bounding_boxes=len(boxes))
+    if not boxes:
+        raise NoPlanFound("No slabs found between the grey boxes. Please check that you have uploaded the correct file.")
 
-    for x1, y1, x2, y2 in boxes:
-            cv2.rectangle(contour_img, (x1, y1), (x2, y2), (0,255,0), 2)
+    def draw_boxes(canvas):
+        for x1, y1, x2, y2 in boxes:
+            cv2.rectangle(canvas, (x1 - ex1, y1 - ey1), (x2 - ex1, y2 - ey1), (0,255,0), 2)
 
     print(f"Detected bounding boxes: found {len(boxes)}")
 
-    cv2.imwrite("./resources/boundingboxes.png", contour_img)
+    artifacts.save("boundingboxes", contour_img, draw_boxes)
 
 
     
-    flattened_enclosing_box = (*enclosing_box[0], *enclosing_box[1]) #flatten to (x1, y1, x2, y2)
+    # Back to page coordinates (draw_boxes still reads the window ones)
+    ox, oy = origin
+    page_boxes = [(x1 + ox, y1 + oy, x2 + ox, y2 + oy) for x1, y1, x2, y2 in boxes] if ox or oy else boxes
+
+    flattened_enclosing_box = (ex1 + ox, ey1 + oy, ex2 + ox, ey2 + oy) #flatten to (x1, y1, x2, y2)
 
-    return boxes, flattened_enclosing_box
+    return page_boxes, flattened_enclosing_box
 
 
 
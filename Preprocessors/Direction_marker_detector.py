@@ -1,16 +1,9 @@
 
 import cv2
 import numpy as np
+from Preprocessors.Helpers import artifacts
 
-def detect_direction_guides(ref_full_img, ref_half_img, target_img):
-
-    print("\nFinding direction guides....")
-    ## Load images in color (default), then convert to grayscale
-    # ref_full_img = cv2.imread('reference_full.png')
-    # ref_half_img = cv2.imread('reference_half.png')
-    # #target_img = cv2.imread('target.png')
-    # target_img = cv2.imread('page1.png')
-
+def red_mask_of(target_img):
     # Convert to HSV color space
     hsv = cv2.cvtColor(target_img, cv2.COLOR_BGR2HSV)
 
@@ -23,7 +16,45 @@ def detect_direction_guides(ref_full_img, ref_half_img, target_img):
     # Create masks for red
     mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
     mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
-    red_mask = cv2.bitwise_or(mask1, mask2)
+    return cv2.bitwise_or(mask1, mask2)
+
+
+def pyramid_red_mask(target_img, factor=4, margin=16, red_excess=16):
+    """
+    red_mask_of(target_img) for pyramid mode: the red is first looked for on a copy shrunk by
+    `factor`, and the full resolution HSV mask is only computed in a window (padded by
+    `margin` pixels) around each red blob found there. The rest of the mask stays 0.
+
+    At the coarse scale a pixel counts as red when its red channel exceeds both others by
+    more than `red_excess`; lenient, as thin red strokes get mixed with the white around them.
+    """
+    small = cv2.resize(target_img, None, fx=1 / factor, fy=1 / factor, interpolation=cv2.INTER_AREA)
+    b, g, r = cv2.split(small)
+    excess = cv2.subtract(r, cv2.max(g, b))
+    _, reddish = cv2.threshold(excess, red_excess, 255, cv2.THRESH_BINARY)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(reddish, connectivity=8)
+
+    height, width = target_img.shape[:2]
+    red_mask = np.zeros((height, width), np.uint8)
+    for x, y, w, h, _ in stats[1:]:
+        x0, y0 = max(x * factor - margin, 0), max(y * factor - margin, 0)
+        x1, y1 = min((x + w) * factor + margin, width), min((y + h) * factor + margin, height)
+        red_mask[y0:y1, x0:x1] = red_mask_of(target_img[y0:y1, x0:x1])
+    return red_mask
+
+
+def detect_direction_guides(ref_full_img, ref_half_img, target_img, red_mask = None):
+    # red_mask: the red mask of target_img if already known (pyramid_red_mask), target_img is then only drawn on
+
+    print("\nFinding direction guides....")
+    ## Load images in color (default), then convert to grayscale
+    # ref_full_img = cv2.imread('reference_full.png')
+    # ref_half_img = cv2.imread('reference_half.png')
+    # #target_img = cv2.imread('target.png')
+    # target_img = cv2.imread('page1.png')
+
+    if red_mask is None:
+        red_mask = red_mask_of(target_img)
 
 
 
@@ -46,9 +77,6 @@ def detect_direction_guides(ref_full_img, ref_half_img, target_img):
     contours_target, _ = cv2.findContours(red_mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
 
 
-    # Draw matches on color version of target image
-    output_img = target_img.copy()  # No need to convert
-
     two_way = []
     one_way = []
 
@@ -57,7 +85,6 @@ def detect_direction_guides(ref_full_img, ref_half_img, target_img):
         cont_diff = cv2.matchShapes(contours_full_ref[0], cnt, cv2.CONTOURS_MATCH_I3, 0)
         if cont_diff< 10:  # Adjust threshold as needed
             x, y, w, h = cv2.boundingRect(cnt)
-            cv2.rectangle(output_img, (x, y), (x + w, y + h), (0, 255, 0), 2)
             two_way.append((x, y, x+w, y+h)) #x1, y1, x2, y2 form
         # # Draw the cont_diff value as text
         #     text = f"{cont_diff:.2f}"
@@ -72,7 +99,6 @@ def detect_direction_guides(ref_full_img, ref_half_img, target_img):
         cont_diff = cv2.matchShapes(contours_half_ref[0], cnt, cv2.CONTOURS_MATCH_I3, 0)
         if cont_diff< 1:  # Adjust threshold as needed
             x, y, w, h = cv2.boundingRect(cnt)
-            cv2.rectangle(output_img, (x, y), (x + w, y + h), (255, 0, 0), 2)
             one_way.append((x, y, x+w, y+h))
         # # Draw the cont_diff value as text
         #     text = f"{cont_diff:.2f}"
@@ -80,7 +106,14 @@ def detect_direction_guides(ref_full_img, ref_half_img, target_img):
         #                 1, (0, 0, 255), 2, cv2.LINE_AA)
             
             
-    cv2.imwrite("./resources/direction_guides.png", output_img)
+    # Draw matches on color version of target image
+    def draw_matches(canvas):
+        for x1, y1, x2, y2 in two_way:
+            cv2.rectangle(canvas, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        for x1, y1, x2, y2 in one_way:
+            cv2.rectangle(canvas, (x1, y1), (x2, y2), (255, 0, 0), 2)
+
+    artifacts.save("direction_guides", target_img, draw_matches)
 
     return two_way, one_way
 
@@ -0,0 +1,104 @@
+import atexit
+import os
+import queue
+import threading
+
+import cv2
+
+# Debug artifact levels
+OFF = "off"                 # nothing is copied, drawn or encoded (production default)
+THUMBNAILS = "thumbnails"   # downscaled PNGs
+FULL = "full"               # full resolution PNGs
+LEVELS = (OFF, THUMBNAILS, FULL)
+
+THUMBNAIL_MAX_DIM = 2000
+QUEUE_SIZE = 4
+
+# The settings live in the environment so that pool worker processes inherit them
+_LEVEL_VAR = "REBAR_ARTIFACTS"
+_DIRECTORY_VAR = "REBAR_ARTIFACTS_DIR"
+
+_prefix = ""
+_queue = None
+_writer = None
+_lock = threading.Lock()
+
+
+def configure(level = OFF, directory = "./resources"):
+    if level not in LEVELS:
+        raise ValueError(f"Artifact level must be one of {LEVELS}, got {level!r}")
+    os.environ[_LEVEL_VAR] = level
+    os.environ[_DIRECTORY_VAR] = directory
+
+
+def level():
+    return os.environ.get(_LEVEL_VAR, OFF)
+
+
+def enabled():
+    return level() != OFF
+
+
+def set_prefix(prefix):
+    # Keeps artifacts of different files / pages apart, e.g. "plan_p2_"
+    global _prefix
+    _prefix = prefix
+
+
+def prefix():
+    return _prefix
+
+
+def save(name, image, draw = None):
+    """
+    Queues a debug image to be written as <directory>/<prefix><name>.png.
+
+    `image` is only read, and must not be modified afterwards. The copy, the
+    `draw(canvas)` callback and the PNG encode all run on the background writer thread.
+    Does nothing at all when artifacts are off.
+    """
+    if not enabled():
+        return
+
+    _start_writer()
+    path = os.path.join(os.environ.get(_DIRECTORY_VAR, "./resources"), f"{_prefix}{name}.png")
+    _queue.put((path, image, draw, level()))  # blocks while the queue is full
+
+
+def flush():
+    # Wait until everything queued so far has been written
+    if _queue is not None:
+        _queue.join()
+
+
+def _start_writer():
+    global _queue, _writer
+    with _lock:
+        if _writer is None:
+            _queue = queue.Queue(maxsize=QUEUE_SIZE)
+            _writer = threading.Thread(target=_write_loop, name="artifact-writer", daemon=True)
+            _writer.start()
+            atexit.register(flush)
+
+
+def _write_loop():
+    while True:
+        path, image, draw, artifact_level = _queue.get()
+        try:
+            canvas = image
+            if draw is not None:
+                canvas = image.copy()
+                draw(canvas)
+
+            if artifact_level == THUMBNAILS:
+                h, w = canvas.shape[:2]
+                scale = THUMBNAIL_MAX_DIM / max(h, w)
+                if scale < 1.0:
+                    canvas = cv2.resize(canvas, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            cv2.imwrite(path, canvas)
+        except Exception as e:
+            print(f"Could not write debug artifact {path}: {e}")
+        finally:
+            _queue.task_done()
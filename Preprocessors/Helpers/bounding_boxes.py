@@ -1,101 +1,178 @@
 import numpy as np
 import cv2
 
+def overlapping_line_pairs(lines):
+    """
+    Index pairs (i, j), i < j, of the segments whose bounding boxes overlap, sorted by i
+    and then j.
+
+    Sweep over the segments sorted by their left end: each one can only overlap the
+    segments that start before its right end. Returns two arrays.
+    """
+    segments = np.asarray(lines, dtype=np.int64).reshape(-1, 4)
+    x_lo, x_hi = segments[:, [0, 2]].min(axis=1), segments[:, [0, 2]].max(axis=1)
+    y_lo, y_hi = segments[:, [1, 3]].min(axis=1), segments[:, [1, 3]].max(axis=1)
+
+    order = np.argsort(x_lo, kind="stable")
+    ends = np.searchsorted(x_lo[order], x_hi[order], side="right")
+    starts = np.arange(1, len(order) + 1)
+    counts = np.maximum(ends - starts, 0)
+
+    first = np.repeat(order, counts)
+    positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+    second = order[positions]
+
+    overlap = (y_lo[first] <= y_hi[second]) & (y_lo[second] <= y_hi[first])
+    i, j = np.minimum(first, second)[overlap], np.maximum(first, second)[overlap]
+    pair_order = np.lexsort((j, i))
+    return i[pair_order], j[pair_order]
+
+
 def get_intersection_bounding_boxes(lines):
-    def segment_intersection(p1, p2, p3, p4):
-    #Returns intersection point if line segments (p1, p2) and (p3, p4) intersect.
-        def ccw(a, b, c):
-            return (c[1] - a[1]) * (b[0] - a[0]) > (b[1] - a[1]) * (c[0] - a[0])
-
-        # Check if segments intersect using CCW method
-        if ccw(p1, p3, p4) != ccw(p2, p3, p4) and ccw(p1, p2, p3) != ccw(p1, p2, p4):
-            # Segments intersect; find the point using line-line intersection
-            def det(a, b):
-                return float(a[0]) * float(b[1]) - float(a[1]) * float(b[0])
-
-            xdiff = (p1[0] - p2[0], p3[0] - p4[0])
-            ydiff = (p1[1] - p2[1], p3[1] - p4[1])
-
-            div = det(xdiff, ydiff)
-            if div == 0:
-                return None  # Lines are parallel
-
-            d = (det(p1, p2), det(p3, p4))
-            x = det(d, xdiff) / div
-            y = det(d, ydiff) / div
-            return int(x), int(y)
-
-        return None  # Segments don't intersect
-
-    rectangles = []
-
-    for i in range(len(lines)):
-        for j in range(i+1, len(lines)):
-            l1 = lines[i]
-            l2 = lines[j]
-            p1, p2 = (l1[0], l1[1]), (l1[2], l1[3])
-            p3, p4 = (l2[0], l2[1]), (l2[2], l2[3])
-            pt = segment_intersection(p1, p2, p3, p4)
-            if pt is None:
-                continue
+    """
+    For every pair of crossing segments (i < j, in order), the rectangle centred at their
+    intersection that reaches the furthest of their endpoints, as ((x1, y1), (x2, y2)).
+
+    Segments can only cross if their bounding boxes overlap, so overlapping_line_pairs
+    picks the candidate pairs and the crossing test (counter-clockwise orientations, in
+    integers) and the intersection point are computed for all of them at once.
+    """
+    if len(lines) < 2:
+        return []
+
+    segments = np.asarray(lines, dtype=np.int64).reshape(-1, 4)
+    i, j = overlapping_line_pairs(segments)
+    x1, y1, x2, y2 = segments[i].T
+    x3, y3, x4, y4 = segments[j].T
 
-            xs = [p1[0], p2[0], p3[0], p4[0]]
-            ys = [p1[1], p2[1], p3[1], p4[1]]
+    def ccw(ax, ay, bx, by, cx, cy):
+        return (cy - ay) * (bx - ax) > (by - ay) * (cx - ax)
 
-            cx, cy = pt
+    crossing = (ccw(x1, y1, x3, y3, x4, y4) != ccw(x2, y2, x3, y3, x4, y4)) & \
+               (ccw(x1, y1, x2, y2, x3, y3) != ccw(x1, y1, x2, y2, x4, y4))
 
-            # Get max horizontal and vertical distance from intersection to endpoints
-            half_width = max(abs(cx - x) for x in xs)
-            half_height = max(abs(cy - y) for y in ys)
+    # Line-line intersection from the determinants, truncated to integers
+    fx1, fy1, fx2, fy2, fx3, fy3, fx4, fy4 = (v.astype(np.float64) for v in (x1, y1, x2, y2, x3, y3, x4, y4))
+    xdiff = ((x1 - x2).astype(np.float64), (x3 - x4).astype(np.float64))
+    ydiff = ((y1 - y2).astype(np.float64), (y3 - y4).astype(np.float64))
+    div = xdiff[0] * ydiff[1] - ydiff[0] * xdiff[1]
+    crossing &= div != 0  # parallel
 
-            # Build rectangle centered at intersection
-            x1, y1 = int(cx - half_width), int(cy - half_height)
-            x2, y2 = int(cx + half_width), int(cy + half_height)
+    d = (fx1 * fy2 - fy1 * fx2, fx3 * fy4 - fy3 * fx4)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = (d[0] * xdiff[1] - d[1] * xdiff[0]) / div
+        y = (d[0] * ydiff[1] - d[1] * ydiff[0]) / div
 
-            rectangles.append(((x1, y1), (x2, y2)))
+    keep = np.nonzero(crossing)[0]
+    cx, cy = np.trunc(x[keep]).astype(np.int64), np.trunc(y[keep]).astype(np.int64)
+    xs = np.stack([x1[keep], x2[keep], x3[keep], x4[keep]])
+    ys = np.stack([y1[keep], y2[keep], y3[keep], y4[keep]])
 
-    return rectangles
+    # Rectangle centred at the intersection, reaching the furthest endpoint
+    half_width = np.abs(cx - xs).max(axis=0)
+    half_height = np.abs(cy - ys).max(axis=0)
+
+    corners = np.stack([cx - half_width, cy - half_height, cx + half_width, cy + half_height], axis=1).tolist()
+    return [((left, top), (right, bottom)) for left, top, right, bottom in corners]
 
 
 def merge_rectangles_with_morphology(rectangles, image, filter = True):
     """
-    Merges bounding rectangles using morphological operations.
-    
-    :param rectangles: List of bounding boxes [(x1, y1, x2, y2), ...]
-    :param image: The image on which the rectangles will be drawn
-    :return: The merged rectangles drawn on the image
+    Merges bounding rectangles using morphological operations: the rectangles are filled
+    in, closed with a 3x3 kernel (1x1 without filter) and the external contours of the
+    result are returned as ((x1, y1), (x2, y2)), in findContours order, dropping the ones
+    10 pixels or less a side if filter is True. Only the size of image is used.
+
+    There is no canvas the size of the image: the closing can only join or reshape
+    rectangles a few pixels apart, so the rectangles are grouped first (union-find over the
+    pairs overlapping_line_pairs finds between the rectangles grown by that reach), and each
+    group is drawn, closed and traced on a canvas just around it. Groups lying in a hole of
+    another group are dropped, as RETR_EXTERNAL never reaches them.
     """
-    
-    # Step 1: Create a black canvas of the same size as the image
-    binary_image = np.zeros_like(image, dtype=np.uint8)
-    
-    # Step 2: Draw the rectangles on the binary image (white)
-    for rect in rectangles:
-        cv2.rectangle(binary_image, rect[0], rect[1], (255), thickness=cv2.FILLED)
-    
-    # Step 3: Apply morphological closing to merge nearby rectangles
+    height, width = image.shape[:2]
     kernel_size = 3 if filter else 1
-    kernel = np.ones((kernel_size, kernel_size), np.uint8)  # Adjust the kernel size to merge closely spaced rectangles
-    closed_image = cv2.morphologyEx(binary_image, cv2.MORPH_CLOSE, kernel)
-    closed_image = cv2.cvtColor(closed_image, cv2.COLOR_BGR2GRAY)
-
-
-    # Step 4: Find contours in the closed image (merged areas)
-    contours, _ = cv2.findContours(closed_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    
-    print(f"Detected merged boxes: found {len(contours)}")
+    kernel = np.ones((kernel_size, kernel_size), np.uint8)
+    # Dilation reaches kernel_size // 2 past a rectangle and erosion looks as far again
+    pad = 2 * (kernel_size // 2) + 1
+
+    # cv2.rectangle orders the corners and clips to the canvas; rectangles off the canvas draw nothing
+    boxes = []
+    for (x1, y1), (x2, y2) in rectangles:
+        x0, x1 = max(min(x1, x2), 0), min(max(x1, x2), width - 1)
+        y0, y1 = max(min(y1, y2), 0), min(max(y1, y2), height - 1)
+        if x0 <= x1 and y0 <= y1:
+            boxes.append((x0, y0, x1, y1))
+    if not boxes:
+        print("Detected merged boxes: found 0")
+        return []
+    boxes = np.array(boxes, dtype=np.int64)
+
+    parent = list(range(len(boxes)))
+
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    i, j = overlapping_line_pairs(boxes + np.array([-pad, -pad, pad, pad]))
+    for a, b in zip(i.tolist(), j.tolist()):
+        parent[find(a)] = find(b)
+
+    groups = {}
+    for index in range(len(boxes)):
+        groups.setdefault(find(index), []).append(index)
+
+    clusters = []     # (x0, y0, x1, y1) of each local canvas, exclusive ends, and its external contours
+    components = []   # (start (y, x), bounding box, cluster index)
+    for members in groups.values():
+        group = boxes[members]
+        x0, y0 = max(group[:, 0].min() - pad, 0), max(group[:, 1].min() - pad, 0)
+        x1, y1 = min(group[:, 2].max() + pad + 1, width), min(group[:, 3].max() + pad + 1, height)
+
+        canvas = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        for bx0, by0, bx1, by1 in group - np.array([x0, y0, x0, y0]):
+            canvas[by0:by1 + 1, bx0:bx1 + 1] = 255
+        closed = cv2.morphologyEx(canvas, cv2.MORPH_CLOSE, kernel)
+        contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            # The trace starts at the first pixel of the component in raster order
+            start_x, start_y = contour[0][0]
+            components.append(((start_y + y0, start_x + x0), (x + x0, y + y0, w, h), len(clusters)))
+        clusters.append(((x0, y0, x1, y1), contours))
+
+    # Drop components inside another group's outline
+    bounds = np.array([cluster[0] for cluster in clusters])
+    filled = {}
+    outer = []
+    for (start_y, start_x), box, cluster in components:
+        around = np.nonzero((bounds[:, 0] <= start_x) & (start_x < bounds[:, 2]) & (bounds[:, 1] <= start_y) & (start_y < bounds[:, 3]))[0]
+        enclosed = False
+        for other in around:
+            if other == cluster:
+                continue
+            (x0, y0, x1, y1), contours = clusters[other]
+            if other not in filled:
+                filled[other] = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+                cv2.drawContours(filled[other], contours, -1, 255, thickness=cv2.FILLED)
+            if filled[other][start_y - y0, start_x - x0]:
+                enclosed = True
+                break
+        if not enclosed:
+            outer.append(((start_y, start_x), box))
+
+    # findContours lists outer contours in reverse order of where they start
+    outer.sort(key=lambda component: component[0], reverse=True)
+    print(f"Detected merged boxes: found {len(outer)}")
 
-    # Step 5: Draw the final merged rectangles
     filtered_contours = []
-    for contour in contours:
-        x, y, w, h = cv2.boundingRect(contour)
+    for _, (x, y, w, h) in outer:
         if not filter or (w > 10 and h > 10):  # Filter out very small rectangles, only if filter is True
             filtered_contours.append(((x, y), (x + w, y + h)))
-    
-    return filtered_contours
 
-    
+    return filtered_contours
 
 
 def compute_overlap(a_min, a_max, b_min, b_max):
@@ -103,6 +180,44 @@ def compute_overlap(a_min, a_max, b_min, b_max):
 
 
 
+def index_snap_lines(lines):
+    """
+    Splits snap lines into horizontal (y ends less than 5 apart) and vertical ones (x ends
+    less than 5 apart) and sorts each kind by its position: horizontal lines by y, vertical
+    lines by x.
+
+    Each kind is (positions, extent starts, extent ends, line indices), all sorted by position.
+    """
+    segments = np.asarray(lines, dtype=np.int64).reshape(-1, 4)
+    x1, y1, x2, y2 = segments.T
+    horizontal = np.abs(y1 - y2) < 5
+    vertical = ~horizontal & (np.abs(x1 - x2) < 5)
+
+    def sorted_kind(mask, position, start, end):
+        indices = np.nonzero(mask)[0]
+        order = np.argsort(position[indices], kind="stable")
+        indices = indices[order]
+        return position[indices], start[indices], end[indices], indices
+
+    return (sorted_kind(horizontal, y1, np.minimum(x1, x2), np.maximum(x1, x2)),
+            sorted_kind(vertical, x1, np.minimum(y1, y2), np.maximum(y1, y2)))
+
+
+def nearest_snap_line(kind, edge, low, high, threshold):
+    # Index of the line closest to `edge` among those overlapping low..high, the first one
+    # in the original order on ties, or None if none is within threshold + 1
+    positions, starts, ends, indices = kind
+    first = np.searchsorted(positions, edge - threshold - 1, side="right")
+    last = np.searchsorted(positions, edge + threshold + 1, side="left")
+
+    distances = np.abs(positions[first:last] - edge)
+    near = (np.minimum(ends[first:last], high) - np.maximum(starts[first:last], low) > 0) & (distances < threshold + 1)
+    if not near.any():
+        return None
+    distances, candidates = distances[near], indices[first:last][near]
+    return candidates[np.lexsort((candidates, distances))[0]]
+
+
 def snap_rectangles_to_lines(rectangles, lines, threshold=50):
     """
     Symmetrically adjusts rectangle edges to snap to the closest nearby horizontal or vertical lines,
@@ -115,7 +230,11 @@ def snap_rectangles_to_lines(rectangles, lines, threshold=50):
 
     Returns:
     - List of adjusted rectangles
+
+    The lines near each edge are looked up by binary search in index_snap_lines instead of
+    going through every line.
     """
+    horizontal, vertical = index_snap_lines(lines)
     adjusted_rects = []
 
     for (rx1, ry1), (rx2, ry2) in rectangles:
@@ -125,41 +244,18 @@ def snap_rectangles_to_lines(rectangles, lines, threshold=50):
         center_y = (top + bottom) // 2
         center_x = (left + right) // 2
 
-        # Initialize distances
-        min_top_dist = min_bottom_dist = threshold + 1
-        min_left_dist = min_right_dist = threshold + 1
-
-        closest_top = top
-        closest_bottom = bottom
-        closest_left = left
-        closest_right = right
-
-        for x1, y1, x2, y2 in lines:
-            if abs(y1 - y2) < 5:  # Horizontal line
-                line_y = y1
-                line_xmin, line_xmax = min(x1, x2), max(x1, x2)
-                if compute_overlap(line_xmin, line_xmax, left, right) > 0:
-                    dist_top = abs(line_y - top)
-                    dist_bottom = abs(line_y - bottom)
-                    if dist_top < min_top_dist:
-                        min_top_dist = dist_top
-                        closest_top = line_y
-                    if dist_bottom < min_bottom_dist:
-                        min_bottom_dist = dist_bottom
-                        closest_bottom = line_y
-
-            elif abs(x1 - x2) < 5:  # Vertical line
-                line_x = x1
-                line_ymin, line_ymax = min(y1, y2), max(y1, y2)
-                if compute_overlap(line_ymin, line_ymax, top, bottom) > 0:
-                    dist_left = abs(line_x - left)
-                    dist_right = abs(line_x - right)
-                    if dist_left < min_left_dist:
-                        min_left_dist = dist_left
-                        closest_left = line_x
-                    if dist_right < min_right_dist:
-                        min_right_dist = dist_right
-                        closest_right = line_x
+        # Distance and position of the closest line to each edge (threshold + 1 and the edge itself if none)
+        def closest(kind, edge, low, high, axis):
+            index = nearest_snap_line(kind, edge, low, high, threshold)
+            if index is None:
+                return threshold + 1, edge
+            position = lines[index][axis]
+            return abs(position - edge), position
+
+        min_top_dist, closest_top = closest(horizontal, top, left, right, 1)
+        min_bottom_dist, closest_bottom = closest(horizontal, bottom, left, right, 1)
+        min_left_dist, closest_left = closest(vertical, left, top, bottom, 0)
+        min_right_dist, closest_right = closest(vertical, right, top, bottom, 0)
 
         # Snap vertically to the closest of top or bottom
         if min_top_dist <= threshold or min_bottom_dist <= threshold:
@@ -186,5 +282,3 @@ def snap_rectangles_to_lines(rectangles, lines, threshold=50):
         adjusted_rects.append(((new_left, new_top), (new_right, new_bottom)))
 
     return adjusted_rects
-
-
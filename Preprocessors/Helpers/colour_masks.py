@@ -0,0 +1,83 @@
+import cv2
+import numpy as np
+
+# Grey boxes: channels within GREY_TOLERANCE of each other and GREY_BRIGHTNESS[0] < gray <= GREY_BRIGHTNESS[1]
+GREY_TOLERANCE = 10
+GREY_BRIGHTNESS = (50, 200)
+# Dark grey whitened before the white box search: channels within DARK_TOLERANCE and gray < DARK_BRIGHTNESS
+DARK_TOLERANCE = 150
+DARK_BRIGHTNESS = 150
+
+
+class ColourWorkspace:
+    """
+    The planes classify_colours returns, kept between calls so a loop over same sized
+    images does not allocate a fresh set for every image.
+
+    The planes are only reallocated when an image of another size comes in, and the
+    masks returned by classify_colours are these planes, so they are overwritten by the
+    next call with the same workspace. The scratch planes of the channel spread are
+    allocated per call and freed when it returns.
+    """
+
+    def __init__(self):
+        self.shape = None
+
+    def fit(self, shape):
+        if shape == self.shape:
+            return
+        self.shape = shape
+        self.gray = np.empty(shape, np.uint8)
+        self.grey_mask = np.empty(shape, np.uint8)
+        self.dark_mask = np.empty(shape, np.uint8)
+
+
+def classify_colours(img, workspace = None):
+    """
+    The colour classes of a BGR image in one pass over its channels.
+
+    A pixel is grey when all pairwise channel differences are below a tolerance, which
+    holds exactly when the spread (max - min channel) is, so the spread and the
+    brightness are computed once and both masks are thresholded from them.
+
+    Returns (gray, grey_mask, dark_mask) as uint8 planes: the grayscale image, the
+    mid-grey box mask (0/255, before clean_grey_mask) and the dark grey pixels that are
+    whitened before the white box search (0/255). Without a workspace they are fresh
+    arrays owned by the caller.
+    """
+    if workspace is None:
+        workspace = ColourWorkspace()
+    workspace.fit(img.shape[:2])
+    ws = workspace
+
+    # Spread of the channels
+    high = cv2.extractChannel(img, 0)
+    low = high.copy()
+    channel = np.empty_like(high)
+    for c in (1, 2):
+        cv2.extractChannel(img, c, dst=channel)
+        cv2.max(high, channel, dst=high)
+        cv2.min(low, channel, dst=low)
+    spread = cv2.subtract(high, low, dst=high)
+    # low is free from here on and holds the brightness bands
+    band = low
+    del channel
+
+    cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=ws.gray)
+
+    # Grey boxes: spread < GREY_TOLERANCE and a mid-range brightness
+    cv2.threshold(spread, GREY_TOLERANCE - 1, 255, cv2.THRESH_BINARY_INV, dst=ws.grey_mask)
+    cv2.inRange(ws.gray, GREY_BRIGHTNESS[0] + 1, GREY_BRIGHTNESS[1], dst=band)
+    cv2.bitwise_and(ws.grey_mask, band, dst=ws.grey_mask)
+
+    # Dark grey: spread < DARK_TOLERANCE and dark
+    cv2.threshold(spread, DARK_TOLERANCE - 1, 255, cv2.THRESH_BINARY_INV, dst=ws.dark_mask)
+    cv2.threshold(ws.gray, DARK_BRIGHTNESS - 1, 255, cv2.THRESH_BINARY_INV, dst=band)
+    cv2.bitwise_and(ws.dark_mask, band, dst=ws.dark_mask)
+
+    return ws.gray, ws.grey_mask, ws.dark_mask
+
+
+def whiten(img, mask):
+    # Sets the masked pixels of img to white in place
+    cv2.bitwise_or(img, (255, 255, 255, 255), dst=img, mask=mask)
@@ -0,0 +1,128 @@
+from functools import cached_property
+
+import cv2
+import numpy as np
+
+
+class ContourTable:
+    """
+    Features of a list of contours as one NumPy array per feature, so detectors can filter
+    with masks instead of calling cv2 on every contour.
+
+    Every column is computed the first time it is read and then kept. The columns that come
+    straight from the points (bounding boxes, areas, lengths) are computed for all contours at
+    once in NumPy and equal what boundingRect, contourArea and arcLength return. The ones that
+    need a cv2 call per contour (approximated vertex counts, solidity) are only computed for
+    the contours asked for, and kept for the next request.
+
+    hierarchy is the one findContours returned, (N, 4) with -1 for none, or None.
+    """
+
+    def __init__(self, contours, hierarchy=None):
+        self.contours = contours
+        self.hierarchy = None if hierarchy is None else hierarchy.reshape(-1, 4)
+        self._approximations = {}
+        self._solidity = None
+
+    def __len__(self):
+        return len(self.contours)
+
+    def subset(self, indices):
+        # The contours at indices, in that order
+        return [self.contours[i] for i in indices]
+
+    @cached_property
+    def _points(self):
+        # All points, and which contour each belongs to
+        if len(self.contours) == 0:
+            return np.zeros((0, 2), np.int64), np.zeros(0, np.int64), np.zeros(1, np.int64)
+        counts = np.array([len(cnt) for cnt in self.contours])
+        owner = np.repeat(np.arange(len(counts)), counts)
+        points = np.concatenate(self.contours).reshape(-1, 2).astype(np.int64)
+        starts = np.concatenate([[0], np.cumsum(counts)])
+        return points, owner, starts
+
+    @cached_property
+    def bboxes(self):
+        # (x, y, w, h) of every contour, like cv2.boundingRect
+        points, _, starts = self._points
+        if len(points) == 0:
+            return np.zeros((0, 4), np.int64)
+        low = np.minimum.reduceat(points, starts[:-1], axis=0)
+        high = np.maximum.reduceat(points, starts[:-1], axis=0)
+        return np.column_stack([low, high - low + 1])
+
+    @cached_property
+    def areas(self):
+        # cv2.contourArea of every contour (shoelace formula, exact for integer points)
+        points, owner, starts = self._points
+        previous = np.roll(points, 1, axis=0)
+        previous[starts[:-1]] = points[starts[1:] - 1]  # each contour closes on itself
+        cross = (previous[:, 0] * points[:, 1] - points[:, 0] * previous[:, 1]).astype(np.float64)
+        return np.abs(np.bincount(owner, weights=cross, minlength=len(self.contours))) * 0.5
+
+    def _step_lengths(self, closed):
+        # Lengths of the steps to every point, in float32 like cv2.arcLength. Closed contours
+        # start with the step from their last point, which arcLength adds up first.
+        points, owner, starts = self._points
+        points = points.astype(np.float32)
+        previous = np.roll(points, 1, axis=0)
+        previous[starts[:-1]] = points[starts[1:] - 1]
+        steps = points - previous
+        lengths = np.sqrt(steps[:, 0] * steps[:, 0] + steps[:, 1] * steps[:, 1])
+        if not closed:
+            lengths[starts[:-1]] = 0
+        return owner, lengths.astype(np.float64)
+
+    @cached_property
+    def lengths(self):
+        # cv2.arcLength(cnt, False) of every contour; bincount adds up in order, like arcLength
+        owner, lengths = self._step_lengths(closed=False)
+        return np.bincount(owner, weights=lengths, minlength=len(self.contours))
+
+    @cached_property
+    def perimeters(self):
+        # cv2.arcLength(cnt, True) of every contour
+        owner, lengths = self._step_lengths(closed=True)
+        return np.bincount(owner, weights=lengths, minlength=len(self.contours))
+
+    def approximations(self, indices, epsilon_factor=0.02):
+        """
+        Vertex counts and areas of cv2.approxPolyDP(cnt, epsilon_factor * perimeter, True)
+        for the contours at indices, as two arrays in the order of indices.
+        """
+        if epsilon_factor not in self._approximations:
+            self._approximations[epsilon_factor] = (np.full(len(self), -1, np.int64), np.zeros(len(self)))
+        vertices, areas = self._approximations[epsilon_factor]
+        indices = np.asarray(indices, dtype=np.int64)
+
+        perimeters = self.perimeters
+        for i in indices[vertices[indices] < 0]:
+            approx = cv2.approxPolyDP(self.contours[i], epsilon_factor * perimeters[i], True)
+            vertices[i] = len(approx)
+            areas[i] = cv2.contourArea(approx)
+        return vertices[indices], areas[indices]
+
+    def solidity(self, indices):
+        # Area over convex hull area for the contours at indices (0 for an empty hull)
+        if self._solidity is None:
+            self._solidity = np.full(len(self), np.nan)
+        indices = np.asarray(indices, dtype=np.int64)
+
+        areas = self.areas
+        for i in indices[np.isnan(self._solidity[indices])]:
+            hull_area = cv2.contourArea(cv2.convexHull(self.contours[i]))
+            self._solidity[i] = float(areas[i]) / hull_area if hull_area > 0 else 0
+        return self._solidity[indices]
+
+    def rectangle_like(self, indices, epsilon_factor=0.02, min_area=100):
+        # Whether the contours at indices approximate to 4 to 6 vertices enclosing more than min_area
+        vertices, areas = self.approximations(indices, epsilon_factor)
+        return (4 <= vertices) & (vertices <= 6) & (areas > min_area)
+
+    def enclosing_box(self, indices):
+        # ((x1, y1), (x2, y2)) around the contours at indices, like get_enclosing_bounding_box
+        boxes = self.bboxes[np.asarray(indices, dtype=np.int64)]
+        x1, y1 = boxes[:, 0].min(), boxes[:, 1].min()
+        x2, y2 = (boxes[:, 0] + boxes[:, 2]).max(), (boxes[:, 1] + boxes[:, 3]).max()
+        return (int(x1), int(y1)), (int(x2), int(y2))
@@ -1,26 +1,82 @@
 import numpy as np
 import math 
 
-# Function to determine if a line is dotted
-def is_dotted(img, line, transition_threshold, regularity_threshold):
-    x1, y1, x2, y2 = line  # Unpack the coordinates of the line
-    line_pixels = img[min(y1, y2):max(y1, y2), min(x1, x2):max(x1, x2)]
-    dark_pixels = np.sum(line_pixels > 200)  # Counts dark pixels
-
-    transitions = np.diff(line_pixels > 100).astype(np.int32)  # Calculate transition points (0->1 or 1->0)
-    
-    # Count number of transitions
-    transition_count = np.sum(np.abs(transitions) > 0)
-    
-    # Ensure the frequency of transitions is approximately equal
-    if transition_count > transition_threshold and np.std(np.diff(np.where(transitions != 0)[0])) < regularity_threshold:  # Check for regularity
-        return "Is Dotted Line"
-    
-    if transition_count <= transition_threshold:
-        return "Not Enough Transitions"
-    
-    if np.std(np.diff(np.where(transitions != 0)[0])) >= regularity_threshold:
-        return "Lines too Irregular"
+DOTTED = "Is Dotted Line"
+NOT_ENOUGH_TRANSITIONS = "Not Enough Transitions"
+TOO_IRREGULAR = "Lines too Irregular"
+_OUTCOMES = (None, DOTTED, NOT_ENOUGH_TRANSITIONS, TOO_IRREGULAR)
+
+
+def classify_dotted_lines(img, lines, transition_threshold, regularity_threshold, band_bytes=32 * 2**20):
+    """
+    Whether each of a batch of (x1, y1, x2, y2) lines is dotted: DOTTED,
+    NOT_ENOUGH_TRANSITIONS, TOO_IRREGULAR, or None when the line has a single transition.
+
+    A line is dotted when the pixels of its bounding box switch between dark and bright
+    (> 100) more than transition_threshold times, at rows spaced regularly enough (standard
+    deviation of the row index between transitions below regularity_threshold). The
+    transitions along each row are read from per-row prefix sums of one transition map,
+    built band by band so that no full-page temporaries are needed.
+    The regularity test only depends on the rows that have transitions: the row indices
+    of all transitions in row-major order differ by 0 within a row and by the gap between
+    consecutive non-empty rows, so their standard deviation comes from the count, the
+    sum and the sum of squares of those gaps, compared in integers.
+    """
+    lines = np.asarray(lines, dtype=np.int64).reshape(-1, 4)
+    count = len(lines)
+    if count == 0:
+        return []
+
+    # Bounding boxes, clipped the way slicing clips them
+    height, width = img.shape[:2]
+    x_lo = np.clip(np.minimum(lines[:, 0], lines[:, 2]), 0, width)
+    x_hi = np.clip(np.maximum(lines[:, 0], lines[:, 2]), 0, width)
+    y_lo = np.clip(np.minimum(lines[:, 1], lines[:, 3]), 0, height)
+    y_hi = np.clip(np.maximum(lines[:, 1], lines[:, 3]), 0, height)
+
+    # One (line, row) pair per row of every bounding box, rows ascending within a line
+    rows_per_line = np.maximum(y_hi - y_lo, 0)
+    line_of_pair = np.repeat(np.arange(count), rows_per_line)
+    first_pair = np.repeat(np.cumsum(rows_per_line) - rows_per_line, rows_per_line)
+    row_of_pair = np.arange(len(line_of_pair)) - first_pair + np.repeat(y_lo, rows_per_line)
+
+    # Transitions in each pair's row; boxes less than 2 pixels wide have none
+    transitions = np.zeros(len(line_of_pair), np.int64)
+    has_columns = (x_hi - x_lo >= 2)[line_of_pair]
+    band = max(1, band_bytes // (4 * width))
+    if has_columns.any():
+        for b0 in range(int(row_of_pair[has_columns].min()), int(row_of_pair[has_columns].max()) + 1, band):
+            b1 = min(b0 + band, height)
+            in_band = has_columns & (row_of_pair >= b0) & (row_of_pair < b1)
+            if not in_band.any():
+                continue
+
+            bright = img[b0:b1] > 100
+            prefix = np.zeros((b1 - b0, width), np.int32)
+            np.cumsum(bright[:, 1:] != bright[:, :-1], axis=1, out=prefix[:, 1:])
+
+            rows = row_of_pair[in_band] - b0
+            pair_lines = line_of_pair[in_band]
+            transitions[in_band] = prefix[rows, x_hi[pair_lines] - 1] - prefix[rows, x_lo[pair_lines]]
+
+    total = np.bincount(line_of_pair, weights=transitions, minlength=count).astype(np.int64)
+
+    # Gaps between consecutive rows with transitions, within each line
+    non_empty = transitions > 0
+    gap_lines, gap_rows = line_of_pair[non_empty], row_of_pair[non_empty]
+    same_line = gap_lines[1:] == gap_lines[:-1]
+    gaps = (gap_rows[1:] - gap_rows[:-1])[same_line]
+    gap_lines = gap_lines[1:][same_line]
+    gap_sum = np.bincount(gap_lines, weights=gaps, minlength=count).astype(np.int64)
+    gap_square_sum = np.bincount(gap_lines, weights=gaps * gaps, minlength=count).astype(np.int64)
+
+    # std < threshold  <=>  m * sum(d^2) - sum(d)^2 < threshold^2 * m^2, with m = transitions - 1 differences
+    m = total - 1
+    regular = m * gap_square_sum - gap_sum * gap_sum < regularity_threshold ** 2 * m * m
+
+    # np.std of no differences is nan, which is neither regular nor irregular
+    outcome = np.where(total <= transition_threshold, 2, np.where(m == 0, 0, np.where(regular, 1, 3)))
+    return [_OUTCOMES[code] for code in outcome]
 
 
 def calculate_angle(x1, y1, x2, y2):
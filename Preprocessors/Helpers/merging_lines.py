@@ -1,3 +1,6 @@
+import heapq
+from collections import defaultdict
+
 import numpy as np
 
 
@@ -33,21 +36,63 @@ def merge_line_group(group):
     return [x1, y1, x2, y2]
 
 def efficient_merge_lines(lines, angle_thresh=5, dist_thresh=100):
+    """
+    Merges HoughLinesP lines into groups: every unused line, in order, starts a group, and
+    each later line that lines_are_mergeable with the group's merged line joins it.
+
+    A line can only join a group if one of its endpoints is within dist_thresh of an endpoint
+    of the group's merged line, which is always an endpoint of one of its members. So line
+    endpoints are bucketed in a grid of dist_thresh cells, and each group only visits the
+    unused lines around its members' endpoints, in index order, instead of every later line.
+    """
     if len(lines) == 0:
         return []
-    
-    used = [False] * len(lines)
+
+    segments = [line[0] for line in lines]
+    cell_size = max(dist_thresh, 1)
+
+    def cell(x, y):
+        return int(x) // cell_size, int(y) // cell_size
+
+    cells = defaultdict(list)
+    for index, (x1, y1, x2, y2) in enumerate(segments):
+        for point_cell in {cell(x1, y1), cell(x2, y2)}:
+            cells[point_cell].append(index)
+
+    used = [False] * len(segments)
     merged = []
 
-    for i in range(len(lines)):
+    for i in range(len(segments)):
         if used[i]:
             continue
-        group = [lines[i][0]]
         used[i] = True
-        for j in range(i+1, len(lines)):
-            if not used[j] and lines_are_mergeable(merge_line_group(group), lines[j][0], angle_thresh, dist_thresh):
-                group.append(lines[j][0])
+        group = [segments[i]]
+        x1, y1, x2, y2 = segments[i]
+        lowest, highest = min((x1, y1), (x2, y2)), max((x1, y1), (x2, y2))
+
+        # Candidates after the line that was just added, visited in index order
+        candidates, queued = [], set()
+
+        def queue_near(segment, after):
+            x1, y1, x2, y2 = segment
+            for cx, cy in {cell(x1, y1), cell(x2, y2)}:
+                for dx in (-1, 0, 1):
+                    for dy in (-1, 0, 1):
+                        for j in cells.get((cx + dx, cy + dy), ()):
+                            if j > after and not used[j] and j not in queued:
+                                queued.add(j)
+                                heapq.heappush(candidates, j)
+
+        queue_near(segments[i], i)
+        while candidates:
+            j = heapq.heappop(candidates)
+            if lines_are_mergeable([*lowest, *highest], segments[j], angle_thresh, dist_thresh):
                 used[j] = True
+                group.append(segments[j])
+                x1, y1, x2, y2 = segments[j]
+                lowest = min(lowest, (x1, y1), (x2, y2))
+                highest = max(highest, (x1, y1), (x2, y2))
+                queue_near(segments[j], j)
         merged.append(merge_line_group(group))
     return merged
 
@@ -84,19 +129,52 @@ def merge_lines_collinear(l1, l2):
     return [*points[idx_min], *points[idx_max]]
 
 def merge_all_colinear_lines(lines, angle_thresh=1, dist_thresh=5):
+    """
+    Merges each unused line, in order, with the later lines that are colinear and touching
+    it, comparing it only with the lines in neighbouring bins instead of with every other line.
+
+    Lines are hashed by angle (bins a little wider than angle_thresh) and by the grid cell
+    (dist_thresh wide) of each endpoint, with the angles of all lines computed in one pass.
+    Lines that are colinear and touching always fall in neighbouring bins; the candidates
+    found there still go through are_colinear_and_touching, so the groups are the same as
+    with a full scan.
+    """
     if len(lines) == 0:
         return []
 
+    segments = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+    angles = np.degrees(np.arctan2(segments[:, 3] - segments[:, 1], segments[:, 2] - segments[:, 0])) % 180
+    # The margin keeps rounding differences from putting lines within angle_thresh two bins apart
+    angle_bins = np.floor(angles / (angle_thresh + 1e-6)).astype(int)
+    cell_size = max(dist_thresh, 1)
+
+    def cells(index):
+        x1, y1, x2, y2 = segments[index]
+        return {(int(x1 // cell_size), int(y1 // cell_size)), (int(x2 // cell_size), int(y2 // cell_size))}
+
+    bins = defaultdict(list)
+    for index in range(len(segments)):
+        for cx, cy in cells(index):
+            bins[(angle_bins[index], cx, cy)].append(index)
+
     merged = []
     used = [False] * len(lines)
-    
+
     for i in range(len(lines)):
         if used[i]:
             continue
-        group = [lines[i]]
         used[i] = True
-        for j in range(i+1, len(lines)):
-            if not used[j] and are_colinear_and_touching(lines[i], lines[j], angle_thresh, dist_thresh):
+
+        near = set()
+        for cx, cy in cells(i):
+            for da in (-1, 0, 1):
+                for dx in (-1, 0, 1):
+                    for dy in (-1, 0, 1):
+                        near.update(bins.get((angle_bins[i] + da, cx + dx, cy + dy), ()))
+
+        group = [lines[i]]
+        for j in sorted(near):
+            if j > i and not used[j] and are_colinear_and_touching(lines[i], lines[j], angle_thresh, dist_thresh):
                 group.append(lines[j])
                 used[j] = True
         # Merge all lines in the group into one
@@ -104,4 +182,4 @@ def merge_all_colinear_lines(lines, angle_thresh=1, dist_thresh=5):
         for l in group[1:]:
             current = merge_lines_collinear(current, l)
         merged.append(current)
-    return merged
\ No newline at end of file
+    return merged
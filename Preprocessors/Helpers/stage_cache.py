@@ -0,0 +1,117 @@
+import glob
+import hashlib
+import json
+import os
+
+import fitz  # PyMuPDF
+
+from Preprocessors.Helpers import tracing
+
+# The cache directory lives in the environment so that pool worker processes inherit it
+_DIRECTORY_VAR = "REBAR_CACHE_DIR"
+
+_code_version = None
+
+
+def configure(directory = None):
+    # None turns the cache off
+    if directory:
+        os.environ[_DIRECTORY_VAR] = directory
+    else:
+        os.environ.pop(_DIRECTORY_VAR, None)
+
+
+def directory():
+    return os.environ.get(_DIRECTORY_VAR)
+
+
+def enabled():
+    return bool(directory())
+
+
+def page_key(pdf_path, page_number):
+    """
+    Hash of everything that ends up in the rendered page: its size and rotation, its
+    content streams and the images, forms and annotations it draws. Independent of the
+    file name and of any other page in the file.
+    """
+    digest = hashlib.sha256()
+    with fitz.open(pdf_path) as doc:
+        page = doc[page_number]
+        digest.update(repr((tuple(page.rect), page.rotation)).encode())
+        for xref in page.get_contents():
+            digest.update(doc.xref_stream_raw(xref) or b"")
+
+        xrefs = [image[0] for image in page.get_images(full=True)] + [xobject[0] for xobject in page.get_xobjects()]
+        xrefs += [annot.xref for annot in page.annots()]
+        for xref in xrefs:
+            digest.update(doc.xref_object(xref, compressed=True).encode())
+            if doc.xref_is_stream(xref):
+                digest.update(doc.xref_stream_raw(xref) or b"")
+    return digest.hexdigest()
+
+
+def code_version():
+    # Results are only reused with the same detector code
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for path in sorted(glob.glob(os.path.join(root, "*.py")) + glob.glob(os.path.join(root, "Helpers", "*.py"))):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        _code_version = digest.hexdigest()[:16]
+    return _code_version
+
+
+def params_hash(params):
+    text = json.dumps({"params": params, "code": code_version()}, sort_keys=True, default=_to_python)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def cached(key, stage, params, compute):
+    """
+    Returns the result of `compute()` for this page, stage and parameters, from the cache
+    if it has been computed before. `key` is the page_key, or None to always compute.
+
+    Results have to be made of lists, tuples and numbers. They come back with lists of
+    numbers as tuples, and numpy numbers as plain Python numbers.
+    """
+    if key is None or not enabled():
+        return compute()
+
+    path = os.path.join(directory(), key[:2], key, f"{stage}-{params_hash(params)}.json")
+    if os.path.exists(path):
+        with tracing.span(f"cache[{stage}]"):
+            try:
+                with open(path) as f:
+                    result = _restore(json.load(f))
+                print(f"Using cached {stage}")
+                return result
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable cache entry {path}: {e}")
+
+    result = compute()
+
+    # Write to a temporary file first so that concurrent runs never read half an entry
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(result, f, default=_to_python)
+    os.replace(tmp_path, path)
+    return result
+
+
+def _to_python(value):
+    # numpy scalars and arrays
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Cannot cache a {type(value).__name__}")
+
+
+def _restore(value):
+    if isinstance(value, list):
+        if value and all(isinstance(item, (int, float)) for item in value):
+            return tuple(value)
+        return [_restore(item) for item in value]
+    return value
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+_tracer = None                  # active tracer of this process, None when tracing is off
+_local = threading.local()      # stack of open spans per thread
+
+
+class Span:
+    def __init__(self, name):
+        self.name = name
+        self.counts = {}
+
+    def count(self, **counts):
+        # Item counts, e.g. span.count(hough_lines=len(lines))
+        self.counts.update({key: int(value) for key, value in counts.items()})
+
+
+class Tracer:
+    """
+    Collects one record per finished span: wall time, CPU time, peak RSS delta and item counts.
+
+    CPU time is process CPU time, so it includes OpenCV's own worker threads.
+    Peak RSS delta is how much the span raised the process's memory high-water mark.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        with self.lock:
+            self.records.append(record)
+
+    def extend(self, records):
+        # Merge records traced in another process (e.g. a pool worker)
+        with self.lock:
+            self.records.extend(records)
+
+    def write(self, json_path, chrome_path=None):
+        records = sorted(self.records, key=lambda record: record["start_us"])
+        with open(json_path, "w") as f:
+            json.dump({"spans": records}, f, indent=2)
+
+        if chrome_path:
+            # Chrome trace format, open with chrome://tracing or https://ui.perfetto.dev
+            events = [{
+                "name": record["name"],
+                "cat": "stage",
+                "ph": "X",
+                "ts": record["start_us"],
+                "dur": round(record["wall_ms"] * 1000),
+                "pid": record["pid"],
+                "tid": record["tid"],
+                "args": {"cpu_ms": record["cpu_ms"], "peak_rss_delta_mb": record["peak_rss_delta_mb"], **record["counts"]},
+            } for record in records]
+            with open(chrome_path, "w") as f:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def start():
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def stop():
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def enabled():
+    return _tracer is not None
+
+
+def merge(records):
+    # Adds spans recorded in another process (e.g. a pool worker) to the active tracer
+    if _tracer is not None:
+        _tracer.extend(records)
+
+
+@contextmanager
+def span(name, **counts):
+    """
+    Times the enclosed block as one stage. Yields a Span for adding item counts;
+    costs next to nothing when tracing is off.
+    """
+    current = Span(name)
+    current.count(**counts)
+    tracer = _tracer
+    if tracer is None:
+        yield current
+        return
+
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(current)
+
+    start_us = time.time_ns() // 1000
+    start_wall, start_cpu, start_peak = time.perf_counter(), time.process_time(), peak_rss_bytes()
+    try:
+        yield current
+    finally:
+        wall, cpu, peak = time.perf_counter(), time.process_time(), peak_rss_bytes()
+        stack.pop()
+        tracer.add({
+            "name": name,
+            "start_us": start_us,
+            "wall_ms": round((wall - start_wall) * 1000, 3),
+            "cpu_ms": round((cpu - start_cpu) * 1000, 3),
+            "peak_rss_delta_mb": round((peak - start_peak) / 2**20, 3) if peak is not None else None,
+            "counts": current.counts,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        })
+
+
+def count(**counts):
+    # Adds item counts to the innermost open span of this thread
+    stack = getattr(_local, "stack", None)
+    if _tracer is not None and stack:
+        stack[-1].count(**counts)
+
+
+def peak_rss_bytes():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        pass
+    return None
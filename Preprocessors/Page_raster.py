@@ -0,0 +1,71 @@
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+from Preprocessors.Helpers import tracing
+
+
+class PageRaster:
+    """
+    A PDF page rendered once and handed to every stage of the pipeline.
+
+    `image` is a BGR NumPy view straight onto the pixmap's sample buffer - the page is
+    never encoded to PNG and decoded again. The pixmap is kept on the object so the
+    buffer stays alive for as long as the raster is in use.
+    """
+
+    def __init__(self, page, dpi=300):
+        self.pdf_path = page.parent.name
+        self.page_number = page.number
+        self.dpi = dpi
+        self.pdf_width, self.pdf_height = page.rect.width, page.rect.height
+
+        with tracing.span("rasterize", dpi=dpi) as span:
+            self.pixmap = page.get_pixmap(dpi=dpi)
+            self.height, self.width = self.pixmap.height, self.pixmap.width
+
+            # Wrap the RGB samples without copying, then swap to BGR in place for OpenCV
+            image = np.frombuffer(self.pixmap.samples_mv, dtype=np.uint8)
+            image = image.reshape(self.height, self.width, self.pixmap.n)
+            cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=image)
+            self.image = image
+            span.count(pixels=self.width * self.height)
+
+
+class LazyPageRaster:
+    """
+    Stands in for a PageRaster without rendering anything yet.
+
+    The page is only rendered the first time a stage reads pixels, so runs where every
+    stage that needs them comes from the stage cache never rasterize the page at all.
+    """
+
+    def __init__(self, pdf_path, page_number=0, dpi=300):
+        with fitz.open(pdf_path) as doc:
+            page = doc[page_number]
+            self.pdf_path = doc.name
+            self.pdf_width, self.pdf_height = page.rect.width, page.rect.height
+
+            # Same pixel grid as page.get_pixmap(dpi=dpi)
+            zoom = dpi / 72
+            bounds = (page.rect * fitz.Matrix(zoom, zoom)).irect
+            self.width, self.height = bounds.width, bounds.height
+
+        self.page_number = page_number
+        self.dpi = dpi
+        self.raster = None
+
+    def __getattr__(self, name):
+        # Only called for what is not set above: image, pixmap, ...
+        if name.startswith("__") or name == "raster":
+            raise AttributeError(name)
+        if self.raster is None:
+            self.raster = load_page_raster(self.pdf_path, self.page_number, self.dpi)
+        return getattr(self.raster, name)
+
+
+def load_page_raster(pdf_path, page_number=0, dpi=300):
+    doc = fitz.open(pdf_path)
+    raster = PageRaster(doc[page_number], dpi)
+    doc.close()
+    return raster
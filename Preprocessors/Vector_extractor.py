@@ -0,0 +1,269 @@
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+from Preprocessors.BoundingBox_detector2 import cut_side_boxes
+
+# The same colour classes the raster path uses (classify_colours / find_black_boxes)
+GREY_TOLERANCE = 10            # channels within 10 of each other
+GREY_BRIGHTNESS = (50, 200)    # exclusive / inclusive grey brightness range
+BLACK_BRIGHTNESS = 50
+
+# The same size filters and painting as find_bounding_boxes
+MIN_BOX_AREA = 400
+MIN_BOX_SIDE = 20
+MIN_BLACK_BOX_AREA = 500
+BLACK_BOX_BORDER = 10          # black boxes are painted with a 20 px wide outline
+MIN_WHITE_BOX_SIDE = 10
+
+
+def brightness(color):
+    r, g, b = (255 * c for c in color)
+    return 0.299 * r + 0.587 * g + 0.114 * b
+
+
+def is_grey(color):
+    if not color or len(color) != 3:
+        return False
+    channels = [255 * c for c in color]
+    return max(channels) - min(channels) < GREY_TOLERANCE and GREY_BRIGHTNESS[0] < brightness(color) <= GREY_BRIGHTNESS[1]
+
+
+def is_black(color):
+    return bool(color) and len(color) == 3 and brightness(color) < BLACK_BRIGHTNESS
+
+
+def item_rect(item):
+    # The axis-aligned rectangle of a path item, or None if it is not one (curves, slanted lines...)
+    kind = item[0]
+    if kind == "re":
+        return fitz.Rect(item[1])
+    if kind == "qu" and item[1].is_rectangular:
+        return item[1].rect
+    if kind == "l":
+        p1, p2 = item[1], item[2]
+        if p1.x == p2.x or p1.y == p2.y:
+            return fitz.Rect(p1, p2).normalize()
+    return None
+
+
+def line_subpaths(items):
+    # The "l" items of a path as closed outlines (lists of points), one per run of connected lines
+    subpaths = []
+    for item in items:
+        if item[0] != "l":
+            continue
+        p1, p2 = item[1], item[2]
+        if subpaths and subpaths[-1][-1] == p1:
+            subpaths[-1].append(p2)
+        else:
+            subpaths.append([p1, p2])
+    return subpaths
+
+
+def polygon_rects(subpaths, even_odd=False):
+    """
+    The area filled by closed outlines made of horizontal and vertical edges (L and T shaped
+    beams, squares drawn with lines...), as rectangles: one per run of covered cells in each
+    row of the grid of the outline coordinates. Filled with the even-odd or the nonzero rule,
+    like the PDF path. Returns None if an edge is slanted.
+    """
+    edges = []
+    for points in subpaths:
+        for p1, p2 in zip(points, points[1:] + points[:1]):
+            if p1.x != p2.x and p1.y != p2.y:
+                return None
+            if p1.x == p2.x and p1.y != p2.y:
+                edges.append((p1.x, min(p1.y, p2.y), max(p1.y, p2.y), 1 if p2.y > p1.y else -1))
+
+    xs = sorted({p.x for points in subpaths for p in points})
+    ys = sorted({p.y for points in subpaths for p in points})
+    rects = []
+    for y0, y1 in zip(ys, ys[1:]):
+        cy = (y0 + y1) / 2
+        crossing = [(x, direction) for x, low, high, direction in edges if low < cy < high]
+        run_start = None
+        for x0, x1 in zip(xs, xs[1:]):
+            # Winding number of the cell centre, from the edges to its right
+            cx = (x0 + x1) / 2
+            winding = sum(direction for x, direction in crossing if x > cx)
+            filled = winding % 2 == 1 if even_odd else winding != 0
+            if filled and run_start is None:
+                run_start = x0
+            elif not filled and run_start is not None:
+                rects.append(fitz.Rect(run_start, y0, x0, y1))
+                run_start = None
+        if run_start is not None:
+            rects.append(fitz.Rect(run_start, y0, xs[-1], y1))
+    return rects
+
+
+def stroke_rects(rect, kind, width):
+    # The area covered by stroking an item with the given line width, as rectangles
+    half = width / 2
+    outer = fitz.Rect(rect.x0 - half, rect.y0 - half, rect.x1 + half, rect.y1 + half)
+    if kind == "l" or rect.width <= width or rect.height <= width:
+        return [outer]
+
+    inner = fitz.Rect(rect.x0 + half, rect.y0 + half, rect.x1 - half, rect.y1 - half)
+    return [
+        fitz.Rect(outer.x0, outer.y0, outer.x1, inner.y0),  # top
+        fitz.Rect(outer.x0, inner.y1, outer.x1, outer.y1),  # bottom
+        fitz.Rect(outer.x0, inner.y0, inner.x0, inner.y1),  # left
+        fitz.Rect(inner.x1, inner.y0, outer.x1, inner.y1),  # right
+    ]
+
+
+def extract_shapes(page, zoom):
+    """
+    Pulls the grey beams/slab fills and the black column squares out of the page's drawing
+    commands, in pixel coordinates of a render at `zoom`.
+
+    Returns (grey, black): grey is a list of shapes, each a list of the rectangles it covers;
+    black is a list of rectangles. Returns None if a grey or black fill is not made of
+    horizontal and vertical edges (curves, slanted polygons): those only come out right in
+    the raster.
+    """
+    grey, black = [], []
+    for path in page.get_drawings():
+        filled = path["type"] in ("f", "fs") and path.get("fill_opacity", 1) > 0
+        stroked = path["type"] in ("s", "fs") and path.get("stroke_opacity", 1) > 0
+
+        if filled and (is_grey(path.get("fill")) or is_black(path.get("fill"))):
+            if any(item[0] == "c" or (item[0] == "qu" and not item[1].is_rectangular) for item in path["items"]):
+                return None
+            # Outlines drawn with lines, closed by the fill
+            fill = polygon_rects(line_subpaths(path["items"]), path.get("even_odd", False))
+            if fill is None:
+                return None
+            if fill and is_grey(path.get("fill")):
+                grey.append(fill)
+            if fill and is_black(path.get("fill")):
+                bounds = union_bounds(fill)
+                # find_black_boxes keeps a blob as its bounding box if it fills more than half of it
+                if sum(rect.width * rect.height for rect in fill) > 0.5 * bounds.width * bounds.height:
+                    if stroked and is_black(path.get("color")):
+                        half = (path.get("width") or 1) / 2
+                        bounds = fitz.Rect(bounds.x0 - half, bounds.y0 - half, bounds.x1 + half, bounds.y1 + half)
+                    black.append(bounds)
+
+        for item in path["items"]:
+            rect = item_rect(item)
+            if rect is None:
+                continue
+
+            if filled and is_grey(path.get("fill")) and item[0] != "l":
+                grey.append([rect])
+            if stroked and is_grey(path.get("color")):
+                grey.append(stroke_rects(rect, item[0], path.get("width") or 1))
+
+            if filled and is_black(path.get("fill")) and item[0] != "l":
+                if stroked and is_black(path.get("color")):
+                    # The outline adds half its width all around
+                    half = (path.get("width") or 1) / 2
+                    rect = fitz.Rect(rect.x0 - half, rect.y0 - half, rect.x1 + half, rect.y1 + half)
+                black.append(rect)
+
+    # Drawings come in unrotated page coordinates (already relative to the cropbox), the
+    # raster is rendered rotated
+    scale = page.rotation_matrix * fitz.Matrix(zoom, zoom)
+    grey = [[rect * scale for rect in shape] for shape in grey]
+    black = [rect * scale for rect in black]
+    return grey, black
+
+
+def union_bounds(rects):
+    return fitz.Rect(min(r.x0 for r in rects), min(r.y0 for r in rects), max(r.x1 for r in rects), max(r.y1 for r in rects))
+
+
+def big_enough(rect):
+    return rect.width > MIN_BOX_SIDE and rect.height > MIN_BOX_SIDE and rect.width * rect.height > MIN_BOX_AREA
+
+
+def to_pixels(rect):
+    return int(round(rect.x0)), int(round(rect.y0)), int(round(rect.x1)), int(round(rect.y1))
+
+
+def free_regions(enclosure, obstacles):
+    """
+    Splits the enclosure minus the obstacles into connected regions and returns their
+    bounding boxes (x1, y1, x2, y2), in the order cv2.findContours would list them.
+
+    Works on the grid of the distinct rectangle edges rather than on pixels, so the cost
+    depends on the number of rectangles, not on the size of the sheet.
+    """
+    ex0, ey0, ex1, ey1 = enclosure
+    obstacles = [(max(x0, ex0), max(y0, ey0), min(x1, ex1), min(y1, ey1)) for x0, y0, x1, y1 in obstacles]
+    obstacles = [(x0, y0, x1, y1) for x0, y0, x1, y1 in obstacles if x0 < x1 and y0 < y1]
+
+    xs = np.unique([ex0, ex1] + [x for x0, _, x1, _ in obstacles for x in (x0, x1)])
+    ys = np.unique([ey0, ey1] + [y for _, y0, _, y1 in obstacles for y in (y0, y1)])
+
+    # Grid cell (i, j) spans ys[i]..ys[i+1] and xs[j]..xs[j+1]
+    covered = np.zeros((len(ys) - 1, len(xs) - 1), np.uint8)
+    for x0, y0, x1, y1 in obstacles:
+        covered[np.searchsorted(ys, y0):np.searchsorted(ys, y1), np.searchsorted(xs, x0):np.searchsorted(xs, x1)] = 1
+
+    count, labels = cv2.connectedComponents(1 - covered, connectivity=4)
+
+    regions = []
+    for label in range(1, count):
+        rows, cols = np.nonzero(labels == label)
+        top = rows.min()
+        # findContours lists outer contours in reverse order of where they start: top row, then leftmost
+        start = (ys[top], xs[cols[rows == top].min()])
+        regions.append((start, (int(xs[cols.min()]), int(ys[rows.min()]), int(xs[cols.max() + 1]), int(ys[rows.max() + 1]))))
+
+    regions.sort(key=lambda region: region[0], reverse=True)
+    return [box for _, box in regions]
+
+
+def find_bounding_boxes_vector(page, dpi=300):
+    """
+    Vector-first version of find_bounding_boxes: the grey beams/slab fills and black columns
+    are taken from the PDF's drawing commands instead of being recovered from pixels.
+
+    Returns the same (boxes, enclosure) in pixel coordinates of a render at `dpi`, or None
+    if no slabs can be found this way (e.g. a scanned sheet), so the caller can fall back
+    to the raster path.
+    """
+    print("\nFinding bounding boxes from the PDF drawing commands...")
+    zoom = dpi / 72
+    shapes = extract_shapes(page, zoom)
+    if shapes is None:
+        print("Found grey or black fills that are not rectangles")
+        return None
+    grey, black = shapes
+
+    # Same filter as filter_contours on the grey contours
+    grey = [shape for shape in grey if big_enough(union_bounds(shape))]
+    if not grey:
+        print("No grey vector shapes found")
+        return None
+
+    enclosing_box = to_pixels(union_bounds([rect for shape in grey for rect in shape]))
+    ex0, ey0, ex1, ey1 = enclosing_box
+
+    # Black boxes inside the enclosure, same filters as find_black_boxes / filter_contours
+    black_boxes = []
+    for rect in black:
+        x0, y0, x1, y1 = to_pixels(rect)
+        x0, y0, x1, y1 = max(x0, ex0), max(y0, ey0), min(x1, ex1), min(y1, ey1)
+        w, h = x1 - x0, y1 - y0
+        if w > MIN_BOX_SIDE and h > MIN_BOX_SIDE and w * h > MIN_BLACK_BOX_AREA:
+            black_boxes.append((x0, y0, x1, y1))
+
+    # Whatever is not grey or (outlined) black inside the enclosure is a slab
+    obstacles = [to_pixels(rect) for shape in grey for rect in shape]
+    obstacles += [(x0 - BLACK_BOX_BORDER, y0 - BLACK_BOX_BORDER, x1 + BLACK_BOX_BORDER, y1 + BLACK_BOX_BORDER) for x0, y0, x1, y1 in black_boxes]
+    boxes = [(x1, y1, x2, y2) for x1, y1, x2, y2 in free_regions(enclosing_box, obstacles)
+             if x2 - x1 > MIN_WHITE_BOX_SIDE and y2 - y1 > MIN_WHITE_BOX_SIDE]
+
+    enclosure = ((ex0, ey0), (ex1, ey1))
+    boxes = cut_side_boxes(enclosure, boxes)
+    if not boxes:
+        print("No slabs found between the vector shapes")
+        return None
+
+    print(f"Detected bounding boxes: found {len(boxes)}")
+    return boxes, enclosing_box
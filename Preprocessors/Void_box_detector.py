@@ -1,12 +1,55 @@
 import cv2
 import numpy as np
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import math
+import os
 from Preprocessors.Helpers import merging_lines as merge
 from Preprocessors.Helpers import bounding_boxes as bb
 from Preprocessors.Helpers import dotted_lines_check as dotted
+from Preprocessors.Helpers import artifacts, tracing
+from Preprocessors.Helpers.contour_table import ContourTable
+
+# find_voids_tiled: each tile is searched with this much of its neighbours around it, so
+# voids up to about this size near a seam are still seen whole by the tile that owns them
+VOID_TILE_SIZE = 4096
+VOID_TILE_OVERLAP = 1024
+
+class VoidDetectionSession:
+    """
+    What the medium and large void passes share for one page, computed once: the ROI crop,
+    its grey image and its binary image.
+
+    The ContourTable of each binary image the passes ask for is computed once
+    (the large pass erodes it first), so either pass can run on its own thread.
+    """
+
+    def __init__(self, img, roi=None):
+        # Apply ROI cropping if specified
+        if roi:
+            (x1, y1), (x2, y2) = roi
+            img = img[y1:y2, x1:x2]
+            self.roi_offset = (x1, y1)
+        else:
+            self.roi_offset = (0, 0)
+        self.img = img
+
+        # Convert to grayscale, and get a binary image
+        self.gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        _, self.binary = cv2.threshold(self.gray, 130, 255, cv2.THRESH_BINARY_INV)
+        self.contour_tables = {}
+
+    def contour_table(self, eroded=False):
+        # ContourTable of the binary image, eroded heavily for the large pass to ensure lines are distinct
+        if eroded not in self.contour_tables:
+            binary = cv2.erode(self.binary, (20,20), iterations = 1) if eroded else self.binary
+            # Same contours as RETR_TREE, without building the hierarchy nobody reads
+            contours, _ = cv2.findContours(binary, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+            self.contour_tables[eroded] = ContourTable(contours)
+        return self.contour_tables[eroded]
+
 
-def find_void_boxes_withSize(img, roi=None, size_upper=150, size_lower=10):
+def find_void_boxes_withSize(img, roi=None, size_upper=150, size_lower=10, session=None):
 
     size_limit = 30
     size = "large" if size_upper > size_limit else "medium"
@@ -19,36 +62,25 @@ def find_void_boxes_withSize(img, roi=None, size_upper=150, size_lower=10):
     length_threshold_low = size_lower
     hough_threshold = 30 if size_upper > size_limit else 20
 
-    output = img.copy()
-
-    # Apply ROI cropping if specified
-    if roi:
-        (x1, y1), (x2, y2) = roi
-        img = img[y1:y2, x1:x2]
-        roi_offset = (x1, y1)
-    else:
-        roi_offset = (0, 0)
-
      # -------- STEP 1: Image Processing --------
-    # Convert to grayscale, and get a binary image, and erode
-    imgGray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    _, binary = cv2.threshold(imgGray, 130, 255, cv2.THRESH_BINARY_INV)
-    if size_upper > size_limit:
-        binary = cv2.erode(binary, (20,20), iterations = 1) #erode it heavily to ensure lines are distinct
-    #cv2.imwrite("eroded.png", binary)
+    # Crop, grayscale and binary image are shared with the other pass
+    if session is None:
+        session = VoidDetectionSession(img, roi)
+    page_img = img
+    img = session.img
+    roi_offset = session.roi_offset
+    imgGray = session.gray
 
 
     # -------- STEP 3: Finding Contours --------
     # Filter out long contours before HoughLines --> ONLY TAKE IN DOTTED LINES
-    contours, _ = cv2.findContours(binary, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-    if contours is None:
-        return []
+    contours = session.contour_table(eroded=size_upper > size_limit)
+    tracing.count(contours=len(contours))
     
-    filtered_edges = np.zeros_like(binary)
-    for cnt in contours:
-        arc_len = cv2.arcLength(cnt, False)
-        if length_threshold_low < arc_len < length_threshold_high:
-            cv2.drawContours(filtered_edges, [cnt], -1, 255, thickness=1)
+    filtered_edges = np.zeros_like(session.binary)
+    lengths = contours.lengths
+    keep = np.nonzero((length_threshold_low < lengths) & (lengths < length_threshold_high))[0]
+    cv2.drawContours(filtered_edges, contours.subset(keep), -1, 255, thickness=1)
     # cv2.imwrite("filtered_edges.png", filtered_edges)
 
 
@@ -63,32 +95,40 @@ def find_void_boxes_withSize(img, roi=None, size_upper=150, size_lower=10):
     imgLines = cv2.HoughLinesP(filtered_edges, 1, np.pi / resolution, threshold=hough_threshold, minLineLength=smallest_line_length, maxLineGap=max_line_gap)
     if imgLines is None:
         return []
+    tracing.count(hough_lines=len(imgLines))
     # Loop through all lines detected, and only take in proper lines
     dotted_lines = []
     potential_snap_lines = []
-    for line in imgLines:
+    line_colors = [] # (line, color) pairs for the debug image
+    # Classify all candidates in one pass rather than slicing the image once per line
+    results = dotted.classify_dotted_lines(imgGray, imgLines, transition_threshold, regularity_threshold)
+    for line, result in zip(imgLines, results):
         x1, y1, x2, y2 = line[0]
         theta = dotted.calculate_angle(x1,y1,x2,y2)
-        result = dotted.is_dotted(imgGray, line[0], transition_threshold, regularity_threshold)
         
         if result == "Lines too Irregular":
-            cv2.line(output, (x1, y1), (x2, y2), (0,255 , 0), 2)  # Draw green lines for too irregular lines
+            line_colors.append((line[0], (0,255 , 0)))  # Draw green lines for too irregular lines
 
         elif result == "Not Enough Transitions":
-            cv2.line(output, (x1, y1), (x2, y2), (255,0 , 0), 2)  # Draw blue lines for not enough transitions
+            line_colors.append((line[0], (255,0 , 0)))  # Draw blue lines for not enough transitions
             potential_snap_lines.append((x1, y1, x2, y2))
         elif result == "Is Dotted Line" and abs(theta-0) > anglethresh and abs(180-theta) > anglethresh and abs(theta-90)>anglethresh:  # Check if the line is dotted
             dotted_lines.append((x1, y1, x2, y2))
-            cv2.line(output, (x1, y1), (x2, y2), (0, 0, 255), 2)  # Draw red lines for dotted
+            line_colors.append((line[0], (0, 0, 255)))  # Draw red lines for dotted
         else:
-            cv2.line(output, (x1, y1), (x2, y2), (255,255 , 0), 2)
+            line_colors.append((line[0], (255,255 , 0)))
             potential_snap_lines.append((x1, y1, x2, y2))
     
+    tracing.count(dotted_lines=len(dotted_lines))
     if not dotted_lines:
         return []
 
     # Save the result
-    cv2.imwrite("./resources/lines_detected.png", output)
+    def draw_classified_lines(canvas):
+        for (x1, y1, x2, y2), color in line_colors:
+            cv2.line(canvas, (x1, y1), (x2, y2), color, 2)
+
+    artifacts.save("lines_detected", page_img, draw_classified_lines)
 
 
     # -------- STEP 5: Joining the Disjointed Dotted Lines --------
@@ -123,27 +163,18 @@ def find_void_boxes_withSize(img, roi=None, size_upper=150, size_lower=10):
     merged_lines = merge.efficient_merge_lines(lines, dist_thresh=100 if size_upper > size_limit else 20)
 
 
-    # #Show lines on joinedlines.png
-    # mask = np.zeros_like(imgGray)
-    joinedlines = img.copy()
-    for line in merged_lines:
-        x1, y1, x2, y2 = line
-        cv2.line(joinedlines, (x1, y1), (x2, y2), (255, 0, 255), 2)  # Use purple to distinguish
-    cv2.imwrite("./resources/merged_lines.png", joinedlines)
+    # #Show lines on merged_lines.png
+    artifacts.save("merged_lines", img, lambda canvas, lines=merged_lines: draw_lines(canvas, lines))
 
 
 
     merged_lines = merge.merge_all_colinear_lines(merged_lines)
     print(f"Merged lines: from {len(lines)} to {len(merged_lines)}")
+    tracing.count(joined_lines=len(lines), merged_lines=len(merged_lines))
 
 
     # #Show lines on joinedlines.png
-    # mask = np.zeros_like(imgGray)
-    joinedlines = img.copy()
-    for line in merged_lines:
-        x1, y1, x2, y2 = line
-        cv2.line(joinedlines, (x1, y1), (x2, y2), (255, 0, 255), 2)  # Use purple to distinguish
-    cv2.imwrite("./resources/joinedlines.png", joinedlines)
+    artifacts.save("joinedlines", img, lambda canvas, lines=merged_lines: draw_lines(canvas, lines))
 
 
 
@@ -171,15 +202,16 @@ def find_void_boxes_withSize(img, roi=None, size_upper=150, size_lower=10):
     #Snap rectangles into nearest horizontal or vertical lines
     snap_threshold = 50 if size_upper > size_limit else 5
     snapped_rectangles = bb.snap_rectangles_to_lines(merged_rectangles, potential_snap_lines, snap_threshold)
+    tracing.count(rectangles=len(rectangles), voids=len(snapped_rectangles))
 
     
 
 
     
     # Draw Merged Rectangles
-    output_image = img.copy()
-    for (a, b) in merged_rectangles:
-        cv2.rectangle(output_image, a, b, (0, 0, 255), 2)
+    # output_image = img.copy()
+    # for (a, b) in merged_rectangles:
+    #     cv2.rectangle(output_image, a, b, (0, 0, 255), 2)
 
     # Save the result
     #cv2.imwrite('./resources/merged_voids.png', output_image)
@@ -199,22 +231,163 @@ def find_void_boxes_withSize(img, roi=None, size_upper=150, size_lower=10):
 
 
 
-def find_voids(img, roi = None, detect_mediums = True):
-    if detect_mediums:
-        void_boxes = find_void_boxes_withSize(img, roi, 20, 0) #Medium size
+def draw_lines(canvas, lines):
+    for x1, y1, x2, y2 in lines:
+        cv2.line(canvas, (x1, y1), (x2, y2), (255, 0, 255), 2)  # Use purple to distinguish
+
+
+
+def find_voids(img, roi = None, detect_mediums = True, concurrent = None):
+    # concurrent: run the medium and large passes on two threads (OpenCV releases the GIL),
+    # by default when there is more than one CPU
+    session = VoidDetectionSession(img, roi)
+
+    passes = [("medium", 20, 0)] if detect_mediums else [] #Medium size
+    passes.append(("large", 150, 10)) #Big size boxes
+
+    def run_pass(size, size_upper, size_lower):
+        with tracing.span(f"find_void_boxes_withSize[{size}]"):
+            return find_void_boxes_withSize(img, roi, size_upper, size_lower, session=session)
+
+    if concurrent is None:
+        concurrent = (os.cpu_count() or 1) > 1
+    if concurrent and len(passes) > 1:
+        with ThreadPoolExecutor(len(passes)) as pool:
+            results = list(pool.map(lambda size_pass: run_pass(*size_pass), passes))
     else:
-        void_boxes = []
-    void_boxes.extend(find_void_boxes_withSize(img, roi)) #Big size boxes
+        results = [run_pass(*size_pass) for size_pass in passes]
+
+    void_boxes = [box for boxes in results for box in boxes]
 
-    output = img.copy()
-    for x1, y1, x2, y2 in void_boxes:
-        cv2.rectangle(output, (x1,y1), (x2,y2), (0,0,255), 2)
-    cv2.imwrite('./resources/merged_voids.png', output)
+    def draw_voids(canvas):
+        for x1, y1, x2, y2 in void_boxes:
+            cv2.rectangle(canvas, (x1,y1), (x2,y2), (0,0,255), 2)
+
+    artifacts.save("merged_voids", img, draw_voids)
 
     return void_boxes
 
 
 
+def void_tiles(roi, tile_size=VOID_TILE_SIZE, overlap=VOID_TILE_OVERLAP):
+    # (core, tile) rectangles ((x1, y1), (x2, y2)) covering the roi; tiles are the cores grown by the overlap
+    (x1, y1), (x2, y2) = roi
+    tiles = []
+    for top in range(y1, y2, tile_size):
+        for left in range(x1, x2, tile_size):
+            right, bottom = min(left + tile_size, x2), min(top + tile_size, y2)
+            tile = ((max(left - overlap, x1), max(top - overlap, y1)), (min(right + overlap, x2), min(bottom + overlap, y2)))
+            tiles.append((((left, top), (right, bottom)), tile))
+    return tiles
+
+
+def find_voids_in_tile(tile_img, origin, core, detect_mediums=True, prefix="", trace=False):
+    """
+    find_voids on one tile, in a pool worker or in this process. Returns the voids whose
+    centre lies in the tile's core, in page coordinates, and the trace spans when trace=True.
+    """
+    if trace:
+        tracing.start()
+    page_prefix = artifacts.prefix()
+    artifacts.set_prefix(prefix)
+
+    try:
+        with tracing.span("find_voids[tile]"):
+            boxes = find_voids(tile_img, None, detect_mediums, concurrent=False)
+    finally:
+        artifacts.flush()
+        artifacts.set_prefix(page_prefix)
+
+    (cx1, cy1), (cx2, cy2) = core
+    owned = []
+    for x1, y1, x2, y2 in boxes:
+        x1, y1, x2, y2 = x1 + origin[0], y1 + origin[1], x2 + origin[0], y2 + origin[1]
+        centre_x, centre_y = (x1 + x2) / 2, (y1 + y2) / 2
+        if cx1 <= centre_x < cx2 and cy1 <= centre_y < cy2:
+            owned.append((x1, y1, x2, y2))
+
+    spans = tracing.stop().records if trace else []
+    return owned, spans
+
+
+def reconcile_tile_voids(tile_voids):
+    """
+    Joins the voids of neighbouring tiles that overlap across a seam (a void too big for the
+    overlap is seen in parts by several tiles) into their bounding box. Voids found by the
+    same tile are left as they are. Returns the voids in tile order.
+    """
+    voids = [box for boxes in tile_voids for box in boxes]
+    if not voids:
+        return []
+    tile_of = [tile for tile, boxes in enumerate(tile_voids) for _ in boxes]
+
+    parent = list(range(len(voids)))
+
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    i, j = bb.overlapping_line_pairs(voids)
+    for a, b in zip(i.tolist(), j.tolist()):
+        if tile_of[a] != tile_of[b]:
+            parent[find(a)] = find(b)
+
+    groups = {}
+    for index in range(len(voids)):
+        groups.setdefault(find(index), []).append(voids[index])
+    return [
+        (min(box[0] for box in group), min(box[1] for box in group), max(box[2] for box in group), max(box[3] for box in group))
+        for group in groups.values()
+    ]
+
+
+def find_voids_tiled(img, roi = None, detect_mediums = True, tile_size = VOID_TILE_SIZE, overlap = VOID_TILE_OVERLAP, workers = None):
+    """
+    find_voids over overlapping tiles of the roi, in a pool of `workers` processes (one per
+    core by default). Each tile keeps the voids centred in its core, and voids split across
+    a seam are joined back by reconcile_tile_voids.
+
+    Hatch lines are searched per tile, so voids bigger than the overlap can come out
+    slightly different from find_voids on the whole roi.
+    """
+    height, width = img.shape[:2]
+    roi = roi or ((0, 0), (width, height))
+    tiles = void_tiles(roi, tile_size, overlap)
+    print(f"\nFinding voids in {len(tiles)} tiles....")
+
+    # Tiles go to the workers as grey crops, which is all the detector reads
+    gray = img if img.ndim == 2 else None
+
+    def tile_args(index):
+        core, ((x1, y1), (x2, y2)) = tiles[index]
+        crop = gray[y1:y2, x1:x2] if gray is not None else cv2.cvtColor(img[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+        return crop, (x1, y1), core, detect_mediums, f"{artifacts.prefix()}void_tile{index}_"
+
+    workers = min(workers or os.cpu_count() or 1, len(tiles))
+    if workers == 1:
+        results = [find_voids_in_tile(*tile_args(index)) for index in range(len(tiles))]
+    else:
+        trace = tracing.enabled()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(find_voids_in_tile, *tile_args(index), trace) for index in range(len(tiles))]
+            results = [future.result() for future in futures]
+        for _, spans in results:
+            tracing.merge(spans)
+
+    void_boxes = reconcile_tile_voids([boxes for boxes, _ in results])
+    tracing.count(tiles=len(tiles), voids=len(void_boxes))
+
+    def draw_voids(canvas):
+        for x1, y1, x2, y2 in void_boxes:
+            cv2.rectangle(canvas, (x1,y1), (x2,y2), (0,0,255), 2)
+
+    artifacts.save("merged_voids", img, draw_voids)
+
+    return void_boxes
+
+
 # #Example usage
 # img = cv2.imread("./resources/page1.png")
 
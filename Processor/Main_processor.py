@@ -3,15 +3,20 @@ import fitz  # PyMuPDF
 import numpy as np
 import math
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import Preprocessors.BoundingBox_detector2 as bounding_box_detector
 import Preprocessors.Void_box_detector as Void_box_detector
 import Preprocessors.Direction_marker_detector as Direction_marker_detector
 import Preprocessors.Rectangle_subtraction as RS
+from Preprocessors.Page_raster import load_page_raster, LazyPageRaster
+from Preprocessors.Vector_extractor import find_bounding_boxes_vector
+from Preprocessors.Helpers import artifacts, tracing, stage_cache
 import Processor.optimal_lines as OL
 import Processor.Box_grouper2 as  BG
 import Processor.draw_arrows as DA
 import sys
 import os
+import hashlib
 from pathlib import Path
 
 
@@ -22,10 +27,122 @@ def resource_path(relative_path):
     return os.path.join(os.path.abspath("."), relative_path)
 
 
-def process_pdf(pdf_path = None, scale_factor =  0.005):
+HORIZONTAL_COLOR = (0.4, 0.4, 0.8)
+VERTICAL_COLOR = (0.75, 0.25, 0.75)
+
+# Pages with fewer slabs finish the geometry faster than a process round trip
+CONCURRENT_MIN_SLABS = 50
+
+
+def find_slabs(raster, extraction = "raster", pyramid = False):
+    # CAD PDFs already hold the beams and columns as vector paths; scanned sheets go the raster way
+    if extraction == "vector":
+        with tracing.span("find_bounding_boxes_vector") as span:
+            with fitz.open(raster.pdf_path) as doc:
+                found = find_bounding_boxes_vector(doc[raster.page_number], raster.dpi)
+            span.count(bounding_boxes=len(found[0]) if found else 0)
+        if found is not None:
+            return found
+        print("Falling back to finding bounding boxes in the raster")
+
+    return bounding_box_detector.find_bounding_boxes(raster, pyramid)
+
+
+def reinforce_direction(direction, enclosure, slabs_rects, void_rects, two_way_slabs, scale_factor = 0.005, trace = False):
+    """
+    One direction of the reinforcement: beams cut across it, slabs minus voids cut along
+    it, grouping and optimal lines. Returns the (lines, arrows, circles) of every group,
+    and the trace spans when run in another process with trace=True.
+    """
+    if trace:
+        tracing.start()
+    across = "vertical" if direction == "horizontal" else "horizontal"
+
+    #convert beam contours into rectangles by cutting across this direction
+    with tracing.span(f"rectangle_subtraction_beams[{across}]") as span:
+        beams = RS.rectangle_subtraction_beams(enclosure, slabs_rects, 20, 20, 500, direction = across)
+        span.count(rects=len(beams))
+
+    # Do rectangular substraction
+    with tracing.span(f"rectangle_subtraction2[{direction}]") as span:
+        remaining_rects = RS.rectangle_subtraction2(slabs_rects, void_rects, 20, 20, 500, direction = direction)
+        span.count(slabs=len(slabs_rects), voids=len(void_rects), rects=len(remaining_rects))
+
+    # Group threshold for similar top y positions
+    MAX_LEN = 12 // scale_factor #12 meters is the limit
+    with tracing.span(f"group_boxes[{direction}]") as span:
+        groups = BG.group_boxes(remaining_rects, void_rects, beams, MAX_LEN, direction = direction)
+        span.count(rects=len(remaining_rects), groups=len(groups))
+
+    # Line placement settings
+    Y_OFFSET = 6
+    X_OVERLAP = 40
+    X_OFFSET = 6
+    Y_OVERLAP = 40
+
+    if direction == "horizontal":
+        # Find horizontal span, and the lowest and highest x values for the boxes
+        x_leftbound = min(min(x1, x2) for (x1, _, x2, _) in slabs_rects)
+        x_rightbound = max(max(x1, x2) for (x1, _, x2, _) in slabs_rects)
+        x_values = [x for rect in slabs_rects for x in (rect[0], rect[2])]
+        x_min, x_max = min(x_values), max(x_values)
+
+        def optimal_lines(group):
+            return OL.find_optimal_lines_horizontal(two_way_slabs, group, Y_OFFSET, X_OVERLAP, x_rightbound, x_leftbound, x_min, x_max, MAX_LEN)
+    else:
+        # Find vertical span, and the lowest and highest y values for the boxes
+        y_topbound = min(min(y1, y2) for (_, y1, _, y2) in slabs_rects)
+        y_bottombound = max(max(y1, y2) for (_, y1, _, y2) in slabs_rects)
+        y_values = [y for rect in slabs_rects for y in (rect[1], rect[3])]
+        y_min, y_max = min(y_values), max(y_values)
+
+        # Find vertical lines and horizontal arrows
+        def optimal_lines(group):
+            return OL.find_optimal_lines_vertical(two_way_slabs, group, X_OFFSET, Y_OVERLAP, y_topbound, y_bottombound, y_min, y_max, MAX_LEN)
+
+    last_percent = -1 #initialize variable for progress printing
+    results = []
+    with tracing.span(f"optimal_lines[{direction}]") as span:
+        for key, group in groups.items():
+
+            #percentage completion tracking
+            percent = 100 * key // len(groups)
+            if percent % 20 == 0 and percent != last_percent:
+                print(f"Progress ({direction}): {percent}% complete")
+                last_percent = percent
+
+            results.append(optimal_lines(group))
+        span.count(groups=len(groups), lines=sum(len(lines) for lines, _, _ in results))
+
+    spans = tracing.stop().records if trace else []
+    return results, spans
+
+
+def analyse_page(raster, scale_factor = 0.005, extraction = "raster", direction_workers = 1, void_tile_size = None, void_workers = 1, pyramid = False):
+    """
+    Runs detection -> subtraction -> grouping -> optimal lines on one rendered page.
+
+    Returns the annotation geometry in image pixel coordinates, together with the image
+    size it was measured on, so that it can be drawn onto the PDF page later (possibly
+    in another process).
+    direction_workers: with 2, the horizontal and vertical pipelines of dense pages run
+    in two processes at the same time.
+    void_tile_size: search for voids in tiles of this many pixels, over `void_workers`
+    processes (None for one per core), see Void_box_detector.find_voids_tiled.
+    pyramid: locate the grey boxes and the red direction markers on a shrunk copy of the
+    page first, and only search those parts at full resolution.
+    """
+
+    # Debug images of this page get their own file names
+    artifacts.set_prefix(f"{Path(raster.pdf_path).stem}_p{raster.page_number + 1}_")
+
+    # The vision front end only depends on the page and the detector parameters, so its
+    # results are cached (when a cache directory is configured) and reused across runs
+    cache_key = stage_cache.page_key(raster.pdf_path, raster.page_number) if stage_cache.enabled() else None
 
     # Load rectangles and void boxes
-    rectangles, enclosure = bounding_box_detector.find_bounding_boxes(pdf_path)
+    rectangles, enclosure = stage_cache.cached(cache_key, "slabs", {"extraction": extraction, "dpi": raster.dpi, "pyramid": pyramid},
+                                               lambda: find_slabs(raster, extraction, pyramid))
 
     def get_enclosing_bounding_box(lines):
         points = np.array([[x, y] for line in lines for x, y in [(line[0], line[1]), (line[2], line[3])]])
@@ -36,22 +153,49 @@ def process_pdf(pdf_path = None, scale_factor =  0.005):
 
 
     roi = get_enclosing_bounding_box(rectangles)
-    img = cv2.imread("./resources/page1.png")
+
+    def page_image():
+        return raster.image
 
     #should only find void boxes within the part where the floor plan lies in.
-    void_boxes = Void_box_detector.find_voids(img, roi, detect_mediums=True)
+    def find_voids():
+        if void_tile_size:
+            with tracing.span("find_voids_tiled"):
+                return Void_box_detector.find_voids_tiled(page_image(), roi, detect_mediums=True, tile_size=void_tile_size, workers=void_workers)
+        return Void_box_detector.find_voids(page_image(), roi, detect_mediums=True)
+
+    void_boxes = stage_cache.cached(cache_key, "voids", {"roi": roi, "detect_mediums": True, "dpi": raster.dpi, "void_tile_size": void_tile_size},
+                                    find_voids)
 
     #find direction guides
-    half_ref = cv2.imread(resource_path("./Preprocessors/image_references/reference_half.png"))
-    full_ref = cv2.imread(resource_path("./Preprocessors/image_references/reference_full.png"))
-    two_way, one_way = Direction_marker_detector.detect_direction_guides(full_ref, half_ref, img)
+    half_ref_path = resource_path("./Preprocessors/image_references/reference_half.png")
+    full_ref_path = resource_path("./Preprocessors/image_references/reference_full.png")
+
+    def find_direction_guides():
+        half_ref = cv2.imread(half_ref_path)
+        full_ref = cv2.imread(full_ref_path)
+        with tracing.span("detect_direction_guides") as span:
+            if pyramid:
+                red_mask = Direction_marker_detector.pyramid_red_mask(page_image())
+            else:
+                red_mask = None
+            two_way, one_way = Direction_marker_detector.detect_direction_guides(full_ref, half_ref, page_image(), red_mask)
+            span.count(two_way=len(two_way), one_way=len(one_way))
+        return two_way, one_way
+
+    references = [hashlib.sha256(Path(path).read_bytes()).hexdigest() for path in (full_ref_path, half_ref_path)]
+    two_way, one_way = stage_cache.cached(cache_key, "direction_guides", {"references": references, "dpi": raster.dpi, "pyramid": pyramid},
+                                          find_direction_guides)
+
+    # Debug images still read from the page raster, so let them finish before it can be freed
+    artifacts.flush()
 
     #convert rectangles to corner points
     slabs_rects = rectangles #in the form of 4 (x1, y1, x2, y2)
     void_rects = void_boxes #in the form of 4 (x1, y1, x2, y2)
 
-    
-        
+
+
     def inside_rectangle(rect, direction_mark):
         #Checks if the center point of direction_mark lies inside rect.
 
@@ -70,7 +214,7 @@ def process_pdf(pdf_path = None, scale_factor =  0.005):
         # Check if center point lies within rect
         return x_min <= center_x <= x_max and y_min <= center_y <= y_max
 
-    
+
     #Find which slabs are two way
     two_way_slabs = []
     for rect in slabs_rects:
@@ -78,7 +222,7 @@ def process_pdf(pdf_path = None, scale_factor =  0.005):
             if inside_rectangle(rect, direction_mark):
                 two_way_slabs.append(rect)
 
-    
+
     # # Draw each rectangle on the image copy
     #two_way_slabs_pic = img.copy()
     # for (x1, y1, x2, y2) in two_way_slabs:
@@ -90,81 +234,41 @@ def process_pdf(pdf_path = None, scale_factor =  0.005):
 
 
 
-    #convert beam contours into rectangles by cutting horizontally
-    beams_horizontal = RS.rectangle_subtraction_beams(enclosure, slabs_rects, 20, 20, 500, direction = "horizontal")
-    beams_vertical = RS.rectangle_subtraction_beams(enclosure, slabs_rects, 20, 20, 500, direction = "vertical")
-
-
-    # Do rectangular substraction
-
-    remaining_rects_horizontal = RS.rectangle_subtraction2(slabs_rects, void_rects, 20, 20, 500, direction = "horizontal")
-    remaining_rects_vertical = RS.rectangle_subtraction2(slabs_rects, void_rects, 20, 20, 500, direction = "vertical")
-
-    
-
-
-    # Group threshold for similar top y positions
-    MAX_LEN = 12 // scale_factor #12 meters is the limit
-    groups_horizontal = BG.group_boxes(remaining_rects_horizontal, void_rects, beams_vertical, MAX_LEN, direction = "horizontal")
-    groups_vertical = BG.group_boxes(remaining_rects_vertical, void_rects, beams_horizontal, MAX_LEN, direction = "vertical")
+    print("\nFinding optimal lines....")
+    pipeline_args = (enclosure, slabs_rects, void_rects, two_way_slabs, scale_factor)
+    if direction_workers > 1 and len(slabs_rects) >= CONCURRENT_MIN_SLABS:
+        # The horizontal and vertical pipelines never read each other's results
+        # Workers only live for this page, so a crashed one cannot break the next page
+        trace = tracing.enabled()
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(reinforce_direction, direction, *pipeline_args, trace) for direction in ("horizontal", "vertical")]
+            (horizontal, horizontal_spans), (vertical, vertical_spans) = [future.result() for future in futures]
+        tracing.merge(horizontal_spans + vertical_spans)
+    else:
+        horizontal, _ = reinforce_direction("horizontal", *pipeline_args)
+        vertical, _ = reinforce_direction("vertical", *pipeline_args)
 
-    # Find horizontal and vertical span
-    x_leftbound = min(min(x1, x2) for (x1, _, x2, _) in rectangles)
-    x_rightbound = max(max(x1, x2) for (x1, _, x2, _) in rectangles)
-    y_topbound = min(min(y1, y2) for (_, y1, _, y2) in rectangles)
-    y_bottombound = max(max(y1, y2) for (_, y1, _, y2) in rectangles)
 
+    return {
+        "page_number": raster.page_number,
+        "image_size": (raster.width, raster.height),
+        "horizontal": horizontal,
+        "vertical": vertical,
+    }
 
 
 
-    # Load the image to get dimensions
-    image = img
-    img_height, img_width = image.shape[:2]
-
-    # Open the PDF and get page dimensions
-
-    doc = fitz.open(pdf_path)
-    page = doc[0]
+def annotate_page(page, geometry):
+    img_width, img_height = geometry["image_size"]
     pdf_width, pdf_height = page.rect.width, page.rect.height
 
     # Coordinate scaling function
     def scale_coords(x, y):
         return (x / img_width) * pdf_width, (y / img_height) * pdf_height
 
-    # Draw lines on PDF
-    MAX_LEN = 12 // scale_factor #12 meters is the limit
-    Y_OFFSET = 6
-    X_OVERLAP = 40
-    X_OFFSET = 6
-    Y_OVERLAP = 40
-
-    def get_rect_x_range(rects): #find the lowest and highest x values for the boxes
-        x_values = [x for rect in rects for x in (rect[0], rect[2])]
-        return min(x_values), max(x_values)
-
-    def get_rect_y_range(rects):  # find the lowest and highest y values for the boxes
-        y_values = [y for rect in rects for y in (rect[1], rect[3])]
-        return min(y_values), max(y_values)
-
-    x_min, x_max = get_rect_x_range(slabs_rects) #the minimum x and max x for the rectangles
-    y_min, y_max = get_rect_y_range(slabs_rects)  # the minimum y and max y for the rectangles
-
-    print("\nAnnotating diagram....")
-    last_percent = -1 #initialize variable for progress printing
-
-
-    key_h = 0
-    # #PROCESS HORIZONTAL AXIS FIRST
-    horizontal_color = (0.4, 0.4, 0.8)
-    for key_h, group in groups_horizontal.items():
-
-        #percentage completion tracking
-        percent = (100*key_h//(len(groups_horizontal)+len(groups_vertical)))
-        if percent % 20 == 0 and percent != last_percent:
-            print(f"Progress: {percent}% complete")
-            last_percent = percent
-        
-        lines, arrows, circles = OL.find_optimal_lines_horizontal(two_way_slabs, group, Y_OFFSET, X_OVERLAP, x_rightbound, x_leftbound, x_min, x_max, MAX_LEN)
+    # Draw horizontal rebars
+    horizontal_color = HORIZONTAL_COLOR
+    for lines, arrows, circles in geometry["horizontal"]:
 
         for line in lines:
             (x1, y), (x2, y) = line
@@ -174,9 +278,8 @@ def process_pdf(pdf_path = None, scale_factor =  0.005):
             line.set_colors(stroke=horizontal_color)
             line.set_border(width=1.5)
             line.update()
-            # note = page.insert_text((0.5*(sx1 + sx2), 0.5*(sy1+sy2)), str(key_h), fontsize = 6, color = (0, 0 ,1))
 
-        
+
         for arrow in arrows:
             (x, y1), (_, y2) = arrow
             sx, sy1 = scale_coords(x, y1)
@@ -184,7 +287,7 @@ def process_pdf(pdf_path = None, scale_factor =  0.005):
 
             DA.draw_vertical_arrow(page, sx, sy1, sy2, horizontal_color)
 
-        
+
         for circle in circles:
             x, y, minimum_y, maximum_y = circle
             sx, sy = scale_coords(x, y)
@@ -192,41 +295,9 @@ def process_pdf(pdf_path = None, scale_factor =  0.005):
             DA.draw_circles(page, sx, sy, line_color = horizontal_color, line_length = line_len, line_width = 1)
 
 
-        
-        # # Label box indices
-        # for idx, box in group:
-        #     x1, y1, x2, y2 = box
-        #     center_x = int((x1 + x2) / 2)
-        #     center_y = int((y1 + y2) / 2)
-        #     sx, sy = scale_coords(center_x, center_y)
-            
-        #     note = page.insert_text((sx, sy), f"{idx},{key_h}", fontsize=8, color=(1, 0, 0))
-        #     # Writes the idx and group key
-
-        #     # Draw rectangle
-        #     sx1, sy1 = scale_coords(x1, y1)
-        #     sx2, sy2 = scale_coords(x2, y2)
-        #     rect = fitz.Rect(sx1, sy1, sx2, sy2)
-            
-        #     shape = page.new_shape()
-        #     shape.draw_rect(rect)
-        #     shape.finish(color=(0, 1, 0), fill=None, width=0.5)
-        #     shape.commit()
-
-
-    # PROCESS VERTICAL AXIS 
-
-    vertical_color = (0.75, 0.25, 0.75)
-    for key_v, group in groups_vertical.items():
-
-        # percentage completion tracking
-        percent = (100 * (key_v + key_h) // (len(groups_horizontal)+len(groups_vertical)))
-        if percent % 20 == 0 and percent != last_percent:
-            print(f"Progress: {percent}% complete")
-            last_percent = percent
-
-        # Find vertical lines and horizontal arrows
-        lines, arrows, circles = OL.find_optimal_lines_vertical(two_way_slabs, group, X_OFFSET, Y_OVERLAP, y_topbound, y_bottombound, y_min, y_max, MAX_LEN)
+    # Draw vertical rebars
+    vertical_color = VERTICAL_COLOR
+    for lines, arrows, circles in geometry["vertical"]:
 
         for line in lines:
             (x, y1), (x, y2) = line
@@ -236,7 +307,6 @@ def process_pdf(pdf_path = None, scale_factor =  0.005):
             line.set_colors(stroke=vertical_color)
             line.set_border(width=1.5)
             line.update()
-            # note = page.insert_text((sx, 0.5*(sy1 + sy2)), str(key_v), fontsize=6, color=(0, 0, 1))
 
         for arrow in arrows:
             (x1, y), (x2, _) = arrow
@@ -251,37 +321,6 @@ def process_pdf(pdf_path = None, scale_factor =  0.005):
             line_len = scale_coords(maximum_x,0)[0] - scale_coords(minimum_x,0)[0]
             DA.draw_circles(page, sx, sy, line_color = vertical_color, line_length = line_len, line_width = 1)
 
-        # # # Label box indices
-        # for idx, box in group:
-        #     x1, y1, x2, y2 = box
-        #     center_x = int((x1 + x2) / 2)
-        #     center_y = int((y1 + y2) / 2)
-        #     sx, sy = scale_coords(center_x, center_y)
-            
-        #     note = page.insert_text((sx, sy), f"{idx},{key_h}", fontsize=8, color=(1, 0, 0))
-        #     # Writes the idx and group key
-
-        #     # Draw rectangle
-        #     sx1, sy1 = scale_coords(x1, y1)
-        #     sx2, sy2 = scale_coords(x2, y2)
-        #     rect = fitz.Rect(sx1, sy1, sx2, sy2)
-            
-        #     shape = page.new_shape()
-        #     shape.draw_rect(rect)
-        #     shape.finish(color=(0, 1, 0), fill=None, width=0.5)
-        #     shape.commit()
-
-
-
-
-
-
-
-
-
-
-
-
 
     # # Draw rectangles around all void_rects
     # for x1, y1, x2, y2 in void_rects:
@@ -293,9 +332,72 @@ def process_pdf(pdf_path = None, scale_factor =  0.005):
     #     shape.finish(color=(1, 0, 0), fill=None, width=0.5)  # Red outline for voids
     #     shape.commit()
 
-    import os #lazy importing
+
+
+def analyse_page_worker(pdf_path, page_number, scale_factor, trace = False, extraction = "raster", void_tile_size = None, pyramid = False, void_workers = 1):
+    # Runs inside a pool process: render the page here, only the geometry (and the trace spans) go back
+    print(f"\n---- Page {page_number + 1} ----")
+    if trace:
+        tracing.start()
+
+    geometry, failure = None, None
+    try:
+        with tracing.span(f"page {page_number + 1}"):
+            if stage_cache.enabled():
+                # Only rendered if a stage misses the cache
+                raster = LazyPageRaster(pdf_path, page_number)
+            else:
+                raster = load_page_raster(pdf_path, page_number)
+            geometry = analyse_page(raster, scale_factor, extraction, void_tile_size=void_tile_size, void_workers=void_workers, pyramid=pyramid)
+    except bounding_box_detector.NoPlanFound as e:
+        # Cover sheets, notes and schedules; anything else is a real error and goes up
+        print(f"Page {page_number + 1} skipped: {e}")
+        failure = {"page": page_number + 1, "error": str(e)}
+    finally:
+        artifacts.flush()
+
+    spans = tracing.stop().records if trace else []
+    return geometry, failure, spans
+
+
+def analyse_pages(pdf_path, page_numbers, scale_factor = 0.005, workers = None, extraction = "raster", void_tile_size = None, pyramid = False, void_workers = None):
+    # Fan the pages out, one process per core by default. Returns the geometry of the pages
+    # analysed and the pages skipped for having no plan on them ({"page", "error"}).
+    workers = workers or os.cpu_count()
+    # The cores the page processes leave over go to the void tiles of each page
+    void_workers = void_workers or max(1, (os.cpu_count() or 1) // min(workers, len(page_numbers)))
+    if workers == 1 or len(page_numbers) == 1:
+        # In this process the spans go straight into the active tracer, if any
+        results = [analyse_page_worker(pdf_path, page_number, scale_factor, extraction=extraction, void_tile_size=void_tile_size, pyramid=pyramid, void_workers=void_workers) for page_number in page_numbers]
+        return ([geometry for geometry, _, _ in results if geometry is not None],
+                [failure for _, failure, _ in results if failure is not None])
+
+    trace = tracing.enabled()
+    n = len(page_numbers)
+    with ProcessPoolExecutor(max_workers=min(workers, n)) as pool:
+        page_geometries, failed_pages = [], []
+        for geometry, failure, spans in pool.map(analyse_page_worker, [pdf_path] * n, page_numbers, [scale_factor] * n, [trace] * n, [extraction] * n, [void_tile_size] * n, [pyramid] * n, [void_workers] * n):
+            if trace:
+                tracing.merge(spans)
+            if geometry is not None:
+                page_geometries.append(geometry)
+            if failure is not None:
+                failed_pages.append(failure)
+        return page_geometries, failed_pages
+
+
+
+def save_annotated(pdf_path, page_geometries, output_dir = None):
+    # Open the PDF and draw lines on the analysed pages
+    print("\nAnnotating diagram....")
+    doc = fitz.open(pdf_path)
+    for geometry in page_geometries:
+        annotate_page(doc[geometry["page_number"]], geometry)
 
     base_name = "ANNOTATED - " + os.path.basename(doc.name)[:-4]
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        base_name = os.path.join(output_dir, base_name)
 
     ext = ".pdf"
     counter = 0
@@ -315,13 +417,89 @@ def process_pdf(pdf_path = None, scale_factor =  0.005):
 
     doc.close()
     print(f"\nAnnotated PDF saved as {output_path}")
+    return output_path
+
+
+
+def process_pdf(pdf_path = None, scale_factor =  0.005, raster = None, pages = None, workers = None, output_dir = None, open_output = True, trace_dir = None, extraction = "raster", void_tile_size = None, pyramid = False, void_workers = None):
+    """
+    Annotates a PDF with optimal rebar lines and returns (path of the annotated copy,
+    pages skipped as {"page", "error"} dicts).
+
+    pages: None processes the rasterized (first) page only; "all" or a list of page
+    numbers processes those pages in a pool of `workers` processes and merges all the
+    annotations back into a single output document. Pages without a slab plan on them
+    are skipped; NoPlanFound is raised if no page has one.
+    output_dir: where the annotated copy is written (defaults to the working directory).
+    open_output: open the annotated copy afterwards (Windows only).
+    trace_dir: if given, per-stage wall time, CPU time, peak memory and item counts are
+    written there as <name>.spans.json and <name>.trace.json (Chrome trace format).
+    extraction: "raster" (default) recovers the beams and columns from the raster; "vector"
+    takes them from the PDF's drawing commands and falls back to the raster for pages
+    without them (scans) or with fills that are not rectangles. The vector slab boxes can
+    be a few pixels off the raster ones.
+    void_tile_size: search for voids in overlapping tiles of this many pixels. Voids bigger
+    than the tile overlap can come out slightly different.
+    void_workers: processes the void tiles of each page are spread over. None: `workers`
+    for a single page, and the cores left over by the page processes for several pages.
+    pyramid: locate the grey boxes and direction markers at a quarter of the resolution and
+    only search around them at full resolution (raster pages). Faster on sheets with large
+    title blocks and notes; small grey or red features far from the rest can be missed.
+    """
+
+    if trace_dir:
+        tracing.start()
+
+    try:
+        with tracing.span("process_pdf"):
+            if pages is None:
+                # Render the page once; every stage works on this same buffer
+                if raster is None and stage_cache.enabled():
+                    # Only rendered if a stage misses the cache
+                    raster = LazyPageRaster(pdf_path)
+                elif raster is None:
+                    raster = load_page_raster(pdf_path)
+                pdf_path = raster.pdf_path
+                try:
+                    with tracing.span(f"page {raster.page_number + 1}"):
+                        # Split the two directions over two cores, unless asked to stay on one
+                        direction_workers = 2 if (workers or os.cpu_count()) > 1 else 1
+                        page_geometries = [analyse_page(raster, scale_factor, extraction, direction_workers, void_tile_size, void_workers or workers, pyramid)]
+                        failed_pages = []
+                finally:
+                    artifacts.flush()
+            else:
+                if pages == "all":
+                    with fitz.open(pdf_path) as doc:
+                        pages = list(range(doc.page_count))
+                print(f"\nProcessing {len(pages)} pages....")
+                page_geometries, failed_pages = analyse_pages(pdf_path, pages, scale_factor, workers, extraction, void_tile_size, pyramid, void_workers)
+                if not page_geometries:
+                    raise bounding_box_detector.NoPlanFound(f"No slab plan found on any of the {len(pages)} pages")
+
+            with tracing.span("annotate") as span:
+                output_path = save_annotated(pdf_path, page_geometries, output_dir)
+                span.count(pages=len(page_geometries), lines=sum(
+                    len(lines) for geometry in page_geometries
+                    for lines, _, _ in geometry["horizontal"] + geometry["vertical"]
+                ))
+    finally:
+        if trace_dir:
+            tracer = tracing.stop()
+            os.makedirs(trace_dir, exist_ok=True)
+            trace_name = os.path.join(trace_dir, Path(pdf_path or "trace").stem)
+            tracer.write(trace_name + ".spans.json", trace_name + ".trace.json")
+            print(f"Stage trace written to {trace_name}.trace.json")
 
 
     #open file
-    os.startfile(output_path)
+    if open_output and hasattr(os, "startfile"):
+        os.startfile(output_path)
+
+    return output_path, failed_pages
 
 
 
 
 if __name__ == "__main__":
-    process_pdf()
\ No newline at end of file
+    process_pdf()
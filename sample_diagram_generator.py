@@ -1,7 +1,7 @@
-
 import fitz  # PyMuPDF
 import random
 import os
+import sys
 
 # Page and layout settings
 page_width, page_height = fitz.paper_size("a4")
@@ -10,41 +10,40 @@ beam_thickness = 8
 column_size = 10
 beam_color = (0.7, 0.7, 0.7)  # Grey
 column_color = (0, 0, 0)      # Black
+min_cell_size = 60
 
-# Create a new PDF
-doc = fitz.open()
-page = doc.new_page(width=page_width, height=page_height)
-
-# Define the outer rectangle
-outer_rect = fitz.Rect(margin, margin, page_width - margin, page_height - margin)
+MARKER_IMAGES = {
+    "two_way": "./Preprocessors/image_references/reference_full.png",
+    "one_way": "./Preprocessors/image_references/reference_half.png",
+}
 
-# Draw outer beams
-page.draw_rect(outer_rect, color=beam_color, fill=None, width=beam_thickness)
 
-# List to store column positions
-column_positions = []
+def resource_path(relative_path):
+    """ Get absolute path to resource, works for dev and for PyInstaller """
+    if hasattr(sys, '_MEIPASS'):
+        return os.path.join(sys._MEIPASS, relative_path)
+    return os.path.join(os.path.abspath("."), relative_path)
 
-# List to store dashed rectangles
-dashed_rectangles = []
 
 # Function to draw a rectangle with beams and store column positions
-def draw_cell(rect):
+def draw_cell(page, rect, rng, layout, void_density):
     # Draw beams (rectangle border)
     page.draw_rect(rect, color=beam_color, fill=None, width=beam_thickness)
+    layout["cells"].append(rect)
     # Store column positions (corners)
     for x in [rect.x0, rect.x1]:
         for y in [rect.y0, rect.y1]:
-            column_positions.append((x, y))
+            layout["columns"].append((x, y))
 
     # Randomly decide to draw a dashed box in a corner
-    if random.random() < 0.3:  # 30% chance
+    if rng.random() < void_density:
         min_dashed_size = 30
         max_width = rect.width / 2
         max_height = rect.height / 2
         if max_width > min_dashed_size and max_height > min_dashed_size:
-            dw = random.uniform(min_dashed_size, max_width)
-            dh = random.uniform(min_dashed_size, max_height)
-            corner = random.choice(['tl', 'tr', 'bl', 'br'])
+            dw = rng.uniform(min_dashed_size, max_width)
+            dh = rng.uniform(min_dashed_size, max_height)
+            corner = rng.choice(['tl', 'tr', 'bl', 'br'])
             if corner == 'tl':
                 dashed_rect = (rect.x0 + 2, rect.y0 + 2, rect.x0 + dw, rect.y0 + dh)
             elif corner == 'tr':
@@ -53,11 +52,12 @@ def draw_cell(rect):
                 dashed_rect = (rect.x0 + 2, rect.y1 - dh, rect.x0 + dw, rect.y1 - 2)
             else:  # 'br'
                 dashed_rect = (rect.x1 - dw, rect.y1 - dh, rect.x1 - 2, rect.y1 - 2)
-            
-            dashed_rectangles.append(dashed_rect)
+
+            layout["voids"].append(dashed_rect)
+            layout["cells_with_voids"].append(rect)
 
 # Function to draw dashed boxes with diagonals
-def draw_dashed_boxes_on_pdf(rectangles):
+def draw_dashed_boxes_on_pdf(page, rectangles):
     dash_pattern = "[4] 0"
     for rect in rectangles:
         x1, y1, x2, y2 = rect
@@ -77,55 +77,145 @@ def draw_dashed_boxes_on_pdf(rectangles):
         shape3.commit()
 
 # Recursive subdivision of the outer rectangle
-def subdivide(rect, depth=0):
-    min_width = 60
-    min_height = 60
-    if rect.width < 2 * min_width or rect.height < 2 * min_height or depth > 5:
-        draw_cell(rect)
-        return
+def subdivide(rect, rng, depth=0):
+    if rect.width < 2 * min_cell_size or rect.height < 2 * min_cell_size or depth > 5:
+        return [rect]
 
     if rect.width > rect.height:
-        split = random.uniform(rect.x0 + min_width, rect.x1 - min_width)
+        split = rng.uniform(rect.x0 + min_cell_size, rect.x1 - min_cell_size)
         left = fitz.Rect(rect.x0, rect.y0, split, rect.y1)
         right = fitz.Rect(split, rect.y0, rect.x1, rect.y1)
-        subdivide(left, depth + 1)
-        subdivide(right, depth + 1)
+        return subdivide(left, rng, depth + 1) + subdivide(right, rng, depth + 1)
     else:
-        split = random.uniform(rect.y0 + min_height, rect.y1 - min_height)
+        split = rng.uniform(rect.y0 + min_cell_size, rect.y1 - min_cell_size)
         top = fitz.Rect(rect.x0, rect.y0, rect.x1, split)
         bottom = fitz.Rect(rect.x0, split, rect.x1, rect.y1)
-        subdivide(top, depth + 1)
-        subdivide(bottom, depth + 1)
-
-# Start subdivision inside the outer rectangle
-subdivide(outer_rect)
-
-# Draw dashed boxes after subdivision
-draw_dashed_boxes_on_pdf(dashed_rectangles)
-
-# Draw all columns on top
-for x, y in column_positions:
-    page.draw_rect(fitz.Rect(x - column_size/2, y - column_size/2,
-                             x + column_size/2, y + column_size/2),
-                   color=column_color, fill=column_color)
-
-
-base_name = "structural_floor_plan"
-ext = ".pdf"
-counter = 0
-
-while True:
-    output_path = f"{base_name}{'' if counter == 0 else f'_{counter}'}{ext}"
-    try:
-        doc.save(output_path)
-        print(f"Saved as {output_path}")
-        break
-    except Exception as e:
-        if "cannot remove file" in str(e).lower() or "permission denied" in str(e).lower():
-            counter += 1
+        return subdivide(top, rng, depth + 1) + subdivide(bottom, rng, depth + 1)
+
+# Split the largest bay until there are `bays` of them (or none can be split any more)
+def subdivide_into(rect, rng, bays):
+    cells = [rect]
+    while len(cells) < bays:
+        splittable = [cell for cell in cells if max(cell.width, cell.height) >= 2 * min_cell_size]
+        if not splittable:
+            break
+        cell = max(splittable, key=lambda cell: cell.width * cell.height)
+        cells.remove(cell)
+
+        if cell.width > cell.height:
+            split = rng.uniform(cell.x0 + min_cell_size, cell.x1 - min_cell_size)
+            cells += [fitz.Rect(cell.x0, cell.y0, split, cell.y1), fitz.Rect(split, cell.y0, cell.x1, cell.y1)]
         else:
-            raise e
-
-
-doc.close()
-os.startfile(output_path)
+            split = rng.uniform(cell.y0 + min_cell_size, cell.y1 - min_cell_size)
+            cells += [fitz.Rect(cell.x0, cell.y0, cell.x1, split), fitz.Rect(cell.x0, split, cell.x1, cell.y1)]
+    return cells
+
+# Place red loading direction markers in the middle of some bays, preferring bays without voids
+def draw_direction_markers(page, rng, layout, markers):
+    free = [cell for cell in layout["cells"] if cell not in layout["cells_with_voids"]]
+    taken = [cell for cell in layout["cells"] if cell in layout["cells_with_voids"]]
+    rng.shuffle(free)
+    rng.shuffle(taken)
+
+    for i, cell in enumerate((free + taken)[:markers]):
+        kind = "two_way" if i % 2 == 0 else "one_way"
+        size = min(cell.width, cell.height, 120) * 0.35
+        center = (cell.x0 + cell.x1) / 2, (cell.y0 + cell.y1) / 2
+        rect = fitz.Rect(center[0] - size / 2, center[1] - size / 2, center[0] + size / 2, center[1] + size / 2)
+        page.insert_image(rect, filename=resource_path(MARKER_IMAGES[kind]))
+        layout["markers"].append((kind, tuple(rect)))
+
+
+def generate_plan(seed=None, bays=None, void_density=0.3, columns=None, page_size="a4", markers=0):
+    """
+    Draws a random slab plan: grey beams around rectangular bays, black columns at the
+    bay corners, dashed void boxes and (optionally) red loading direction markers.
+
+    The same seed always gives the same plan.
+    bays: number of bays, or None for a random recursive subdivision.
+    void_density: chance of a void in each bay.
+    columns: number of columns to draw, or None for one at every bay corner.
+    page_size: a paper size name ("a4", "a3", ...) or a (width, height) tuple in points.
+    markers: number of direction markers, alternating two way / one way.
+
+    Returns the PDF document and the layout that was drawn, in PDF points.
+    """
+    rng = random.Random(seed)
+    width, height = fitz.paper_size(page_size) if isinstance(page_size, str) else page_size
+
+    # Create a new PDF
+    doc = fitz.open()
+    page = doc.new_page(width=width, height=height)
+    layout = {"cells": [], "columns": [], "voids": [], "cells_with_voids": [], "markers": []}
+
+    # Define the outer rectangle
+    outer_rect = fitz.Rect(margin, margin, width - margin, height - margin)
+
+    # Draw outer beams
+    page.draw_rect(outer_rect, color=beam_color, fill=None, width=beam_thickness)
+
+    # Subdivide the outer rectangle into bays
+    cells = subdivide(outer_rect, rng) if bays is None else subdivide_into(outer_rect, rng, bays)
+    for cell in cells:
+        draw_cell(page, cell, rng, layout, void_density)
+
+    # Draw dashed boxes after subdivision
+    draw_dashed_boxes_on_pdf(page, layout["voids"])
+
+    if markers:
+        draw_direction_markers(page, rng, layout, markers)
+
+    # Draw all columns on top
+    column_positions = layout["columns"]
+    if columns is not None:
+        column_positions = sorted(set(column_positions))
+        column_positions = rng.sample(column_positions, min(columns, len(column_positions)))
+        layout["columns"] = column_positions
+    for x, y in column_positions:
+        page.draw_rect(fitz.Rect(x - column_size/2, y - column_size/2,
+                                 x + column_size/2, y + column_size/2),
+                       color=column_color, fill=column_color)
+
+    del layout["cells_with_voids"]
+    layout["cells"] = [tuple(cell) for cell in layout["cells"]]
+    return doc, layout
+
+
+def save_plan(doc, base_name="structural_floor_plan"):
+    ext = ".pdf"
+    counter = 0
+
+    while True:
+        output_path = f"{base_name}{'' if counter == 0 else f'_{counter}'}{ext}"
+        try:
+            doc.save(output_path, no_new_id=True)  # byte-identical files for the same seed
+            print(f"Saved as {output_path}")
+            break
+        except Exception as e:
+            if "cannot remove file" in str(e).lower() or "permission denied" in str(e).lower():
+                counter += 1
+            else:
+                raise e
+
+    doc.close()
+    return output_path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Draw a random slab plan PDF.")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--bays", type=int, default=None)
+    parser.add_argument("--void-density", type=float, default=0.3)
+    parser.add_argument("--columns", type=int, default=None)
+    parser.add_argument("--page-size", default="a4")
+    parser.add_argument("--markers", type=int, default=0)
+    parser.add_argument("--output", default="structural_floor_plan")
+    args = parser.parse_args()
+
+    doc, _ = generate_plan(args.seed, args.bays, args.void_density, args.columns, args.page_size, args.markers)
+    output_path = save_plan(doc, args.output)
+
+    if hasattr(os, "startfile"):
+        os.startfile(output_path)
@@ -0,0 +1,53 @@
+import contextlib
+import io
+import os
+
+import pytest
+
+import Batch
+from Preprocessors.Helpers import stage_cache
+from tests.test_main_processor import make_pdf
+
+
+@pytest.fixture(autouse=True)
+def no_stage_cache():
+    stage_cache.configure(None)
+
+
+def test_same_named_pdfs_in_different_folders_keep_their_own_output(tmp_path):
+    pdf_paths = []
+    for folder in ("level 1", "level 2"):
+        (tmp_path / "drawings" / folder).mkdir(parents=True)
+        pdf_paths.append(str(tmp_path / "drawings" / folder / "plan.pdf"))
+        make_pdf(pdf_paths[-1], ["plan"])
+    output_dir = str(tmp_path / "annotated")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        manifest = Batch.run_batch(pdf_paths, 0.005, {}, "first", output_dir, str(tmp_path / "manifest.json"), 1,
+                                   trace_dir=os.path.join(output_dir, "traces"))
+
+    entries = [manifest["files"][path] for path in pdf_paths]
+    assert [entry["status"] for entry in entries] == ["done", "done"]
+    assert [entry["output"] for entry in entries] == [
+        os.path.join(output_dir, folder, "ANNOTATED - plan.pdf") for folder in ("level 1", "level 2")
+    ]
+    assert [entry["log"] for entry in entries] == [os.path.join(output_dir, folder, "plan.log") for folder in ("level 1", "level 2")]
+    for folder in ("level 1", "level 2"):
+        assert os.path.exists(os.path.join(output_dir, "traces", folder, "plan.trace.json"))
+
+
+def test_pdfs_from_one_folder_go_straight_into_the_output_dir(tmp_path):
+    paths = [str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")]
+    assert Batch.output_subdirs(paths) == {path: "." for path in paths}
+
+
+def test_scale_table_takes_names_and_paths(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    table = tmp_path / "scales.csv"
+    table.write_text("file,scale\nplan.pdf,0.01\nlevel 2/plan.pdf,0.02\n")
+    scales = Batch.read_scale_table(str(table))
+    assert scales == {"plan.pdf": 0.01, str(tmp_path / "level 2" / "plan.pdf"): 0.02}
+
+    pdf_paths = [str(tmp_path / "level 1" / "plan.pdf"), str(tmp_path / "level 2" / "plan.pdf")]
+    assert Batch.ambiguous_scale_names(scales, pdf_paths) == ["plan.pdf"]
+    assert Batch.ambiguous_scale_names(scales, pdf_paths[:1]) == []
@@ -0,0 +1,125 @@
+import cv2
+import numpy as np
+import pytest
+
+import Preprocessors.BoundingBox_detector2 as BoundingBox_detector2
+
+
+def find_black_boxes(img, enclosing_box, solidity_thresh=0.5, fill_ratio_thresh=0.5):
+    # The original loop over every contour, kept as the reference for BoundingBox_detector2.find_black_boxes
+    x0, y0 = enclosing_box[0]
+    x1, y1 = enclosing_box[1]
+
+    # Crop the region of interest
+    roi = img[y0:y1, x0:x1]
+
+    # Convert to grayscale (unless already a single channel plane) and apply fixed thresholding
+    gray_roi = roi if roi.ndim == 2 else cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    _, binary_mask = cv2.threshold(gray_roi, 50, 255, cv2.THRESH_BINARY_INV)
+
+    # Find contours in the binary mask
+    black_contours, _ = cv2.findContours(binary_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    # Filter and map contours back to original image coordinates
+    black_boxes = []
+    for cnt in black_contours:
+        area = cv2.contourArea(cnt)
+
+        # Solidity
+        hull = cv2.convexHull(cnt)
+        hull_area = cv2.contourArea(hull)
+        solidity = float(area) / hull_area if hull_area > 0 else 0
+
+        # Fill ratio
+        x, y, w, h = cv2.boundingRect(cnt)
+        roi_box = binary_mask[y:y+h, x:x+w]
+        bounding_box_area = w * h
+        fill_ratio = cv2.countNonZero(roi_box) / bounding_box_area if bounding_box_area > 0 else 0
+
+        if area > 500 and solidity > solidity_thresh and fill_ratio > fill_ratio_thresh:
+            cnt[:, 0, 0] += x0  # shift x
+            cnt[:, 0, 1] += y0  # shift y
+            black_boxes.append(cnt)
+
+    return BoundingBox_detector2.axis_aligned_boxes(black_boxes)
+
+
+def find_white_boxes_within_region(image, region_top_left, region_bottom_right):
+    # The original version on a copy of the region, kept as the reference for the in place one
+    x1, y1 = region_top_left
+    x2, y2 = region_bottom_right
+
+    # Crop the region of interest
+    roi = image[y1:y2, x1:x2]
+
+    # Convert to grayscale (unless already a single channel plane) and threshold for white
+    gray = roi if roi.ndim == 2 else cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(gray, 180, 255, cv2.THRESH_BINARY)
+
+    # Optional cleanup to remove small noise
+    kernel = np.ones((4, 4), np.uint8)
+    cleaned = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, iterations=1)
+
+    merge_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (30, 30))  # adjust this size
+    cleaned = cv2.morphologyEx(cleaned, cv2.MORPH_CLOSE, merge_kernel)
+
+    # Find contours in the thresholded image
+    contours, _ = cv2.findContours(cleaned, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    white_boxes = []
+    for cnt in contours:
+        x, y, w, h = cv2.boundingRect(cnt)
+        # Filter small boxes if needed
+        if w > 10 and h > 10:
+            # Adjust coordinates back to original image
+            white_boxes.append((x + x1, y + y1, x + x1 + w, y + y1 + h))
+
+    return white_boxes
+
+
+def dark_blobs(rng):
+    # Solid and outlined boxes, white holes, discs and speckle on a white grey plane
+    height, width = (int(v) for v in rng.integers(50, 400, 2))
+    img = np.full((height, width), 255, np.uint8)
+    for _ in range(int(rng.integers(1, 40))):
+        x, y = int(rng.integers(-20, width)), int(rng.integers(-20, height))
+        a, b = (int(v) for v in rng.integers(2, 120, 2))
+        kind = rng.integers(4)
+        if kind == 0:
+            cv2.rectangle(img, (x, y), (x + a, y + b), 0, -1)
+        elif kind == 1:
+            cv2.rectangle(img, (x, y), (x + a, y + b), 0, int(rng.integers(1, 8)))
+        elif kind == 2:
+            cv2.rectangle(img, (x, y), (x + a, y + b), 255, -1)
+        else:
+            cv2.circle(img, (x, y), a, int(rng.integers(0, 2)) * 255, -1)
+    if rng.random() < 0.3:
+        img[rng.random((height, width)) < 0.05] = 0
+    enclosing_box = ((int(rng.integers(0, 10)), int(rng.integers(0, 10))),
+                     (int(width - rng.integers(0, 10)), int(height - rng.integers(0, 10))))
+    return img, enclosing_box
+
+
+@pytest.mark.parametrize("seed", range(150))
+def test_find_black_boxes_matches_contour_loop(seed):
+    rng = np.random.default_rng(seed)
+    img, enclosing_box = dark_blobs(rng)
+    expected = find_black_boxes(img, enclosing_box)
+    boxes = BoundingBox_detector2.find_black_boxes(img, enclosing_box)
+    assert [box.tolist() for box in boxes] == [box.tolist() for box in expected]
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_find_white_boxes_within_region_matches_copying_version(seed):
+    rng = np.random.default_rng(seed)
+    img, ((x1, y1), (x2, y2)) = dark_blobs(rng)
+    # Mid greys on both sides of the white threshold
+    img[rng.random(img.shape) < 0.1] = int(rng.choice([150, 180, 181, 220]))
+    expected = find_white_boxes_within_region(img, (x1, y1), (x2, y2))
+
+    page = img.copy()
+    boxes = BoundingBox_detector2.find_white_boxes_within_region(page[y1:y2, x1:x2], (x1, y1))
+    assert boxes == expected
+    # Only the view is overwritten
+    page[y1:y2, x1:x2] = img[y1:y2, x1:x2]
+    assert np.array_equal(page, img)
@@ -0,0 +1,88 @@
+import cv2
+import numpy as np
+import pytest
+
+from Preprocessors.BoundingBox_detector2 import clean_grey_mask
+from Preprocessors.Helpers import colour_masks
+
+
+def grey_box_mask(img):
+    # The original grey box mask, kept as the reference for classify_colours + clean_grey_mask
+    # Split B, G, R channels
+    b, g, r = cv2.split(img)
+
+    # Check where R, G, B are close to each other (grey condition)
+    diff_rg = cv2.absdiff(r, g)
+    diff_gb = cv2.absdiff(g, b)
+    diff_br = cv2.absdiff(b, r)
+
+    # Set a threshold for how "close" they should be (tune this!)
+    tolerance = 10
+    grey_mask = (diff_rg < tolerance) & (diff_gb < tolerance) & (diff_br < tolerance)
+
+    # Check brightness is between mid-range (to avoid black or white)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    brightness_mask = (gray > 50) & (gray <= 200)
+
+    # Combine both masks
+    final_mask = (grey_mask & brightness_mask).astype(np.uint8) * 255
+    return clean_grey_mask(final_mask)
+
+
+def whiten_black_pixels(img, tolerance = 150, brightness_threshold = 150):
+    # The original dark grey whitening, kept as the reference for classify_colours + whiten
+    # Convert to grayscale to simplify brightness analysis
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    b, g, r = cv2.split(img)
+    diff_rg = cv2.absdiff(r, g)
+    diff_gb = cv2.absdiff(g, b)
+    diff_br = cv2.absdiff(b, r)
+
+    grey_mask = (diff_rg < tolerance) & (diff_gb < tolerance) & (diff_br < tolerance)
+    dark_mask = gray < brightness_threshold
+
+    # Combine masks
+    remotely_grey_mask = grey_mask & dark_mask
+
+    # Apply the mask to set those pixels to white
+    img[remotely_grey_mask] = [255, 255, 255]
+
+
+def coloured_page(rng, height, width):
+    # Grey boxes and colour patches with values around every threshold, over noise
+    img = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    for _ in range(30):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        level = int(rng.choice([0, 40, 50, 51, 120, 149, 150, 200, 201, 255]))
+        spread = rng.integers(0, 12, 3) if rng.random() < 0.7 else rng.integers(0, 160, 3)
+        colour = [int(v) for v in np.clip(level + spread - spread.min(), 0, 255)]
+        cv2.rectangle(img, (x, y), (x + int(rng.integers(5, 80)), y + int(rng.integers(5, 80))), colour, -1)
+    return img
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_classify_colours_matches_the_separate_masks(seed):
+    rng = np.random.default_rng(seed)
+    workspace = colour_masks.ColourWorkspace()
+    # The workspace is refitted when the size changes and reused when it does not
+    for height, width in ((120, 160), (120, 160), (90, 200)):
+        img = coloured_page(rng, height, width)
+        gray, grey_mask, dark_mask = colour_masks.classify_colours(img, workspace)
+
+        assert np.array_equal(gray, cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+        assert np.array_equal(clean_grey_mask(grey_mask), grey_box_mask(img))
+
+        expected = img.copy()
+        whiten_black_pixels(expected)
+        colour_masks.whiten(img, dark_mask)
+        assert np.array_equal(img, expected)
+
+
+def test_classify_colours_without_a_workspace_returns_fresh_planes():
+    rng = np.random.default_rng(0)
+    first, second = coloured_page(rng, 60, 80), coloured_page(rng, 60, 80)
+    gray, grey_mask, dark_mask = colour_masks.classify_colours(first)
+    expected = [plane.copy() for plane in (gray, grey_mask, dark_mask)]
+    colour_masks.classify_colours(second)
+    assert all(np.array_equal(plane, copy) for plane, copy in zip((gray, grey_mask, dark_mask), expected))
@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+import pytest
+
+from Preprocessors.BoundingBox_detector2 import filter_contours, get_enclosing_bounding_box
+from Preprocessors.Helpers.contour_table import ContourTable
+
+
+def is_rectangle_like(contour, epsilon_factor=0.02, min_area=100):
+    # The original per contour check, kept as the reference for ContourTable.rectangle_like
+    # Approximate the contour
+    epsilon = epsilon_factor * cv2.arcLength(contour, True)
+    approx = cv2.approxPolyDP(contour, epsilon, True)
+
+    # Check if it's a quadrilateral and convex
+    if 4 <= len(approx) <= 6:
+        area = cv2.contourArea(approx)
+        if area > min_area:
+            return True
+    return False
+
+
+def reference_filter_contours(contours, min_area, min_width, min_height, rectangle_check = False):
+    # The original filter_contours loop (without the rejected list), kept as the reference for filter_contours
+    filtered_contours = []
+    for cnt in contours:
+        area = cv2.contourArea(cnt)
+        x, y, w, h = cv2.boundingRect(cnt)
+        is_rect = is_rectangle_like(cnt) if rectangle_check else True
+        if area > min_area and  w > min_width and h > min_height and is_rect:
+            filtered_contours.append(cnt)
+    return filtered_contours
+
+
+def random_contours(seed):
+    # Contours (with holes) of random speckle, grown into blobs on odd seeds
+    rng = np.random.default_rng(seed)
+    height, width = (int(v) for v in rng.integers(20, 300, 2))
+    img = (rng.random((height, width)) < rng.uniform(0.05, 0.6)).astype(np.uint8) * 255
+    if seed % 2:
+        img = cv2.dilate(img, np.ones((3, 3), np.uint8), iterations=int(rng.integers(1, 4)))
+    contours, hierarchy = cv2.findContours(img, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    return contours, hierarchy
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_columns_match_cv2(seed):
+    contours, hierarchy = random_contours(seed)
+    table = ContourTable(contours, hierarchy)
+    indices = np.arange(len(contours))
+
+    assert np.array_equal(table.bboxes.reshape(-1, 4), np.array([cv2.boundingRect(c) for c in contours]).reshape(-1, 4))
+    assert np.array_equal(table.areas, [cv2.contourArea(c) for c in contours])
+    assert np.array_equal(table.lengths, [cv2.arcLength(c, False) for c in contours])
+    assert np.array_equal(table.perimeters, [cv2.arcLength(c, True) for c in contours])
+    assert np.array_equal(table.rectangle_like(indices), [is_rectangle_like(c) for c in contours])
+
+    solidity = []
+    for c in contours:
+        hull_area = cv2.contourArea(cv2.convexHull(c))
+        solidity.append(float(cv2.contourArea(c)) / hull_area if hull_area > 0 else 0)
+    assert np.array_equal(table.solidity(indices), solidity)
+
+    if len(contours):
+        assert table.enclosing_box(indices) == get_enclosing_bounding_box(contours)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_filter_contours_matches_contour_loop(seed):
+    contours, hierarchy = random_contours(seed)
+    table = ContourTable(contours, hierarchy)
+    for limits in ((400, 20, 20), (10, 3, 3)):
+        for rectangle_check in (False, True):
+            kept = table.subset(filter_contours(table, *limits, rectangle_check=rectangle_check))
+            expected = reference_filter_contours(contours, *limits, rectangle_check=rectangle_check)
+            assert [c.tolist() for c in kept] == [c.tolist() for c in expected]
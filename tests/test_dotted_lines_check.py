@@ -0,0 +1,75 @@
+import warnings
+
+import cv2
+import numpy as np
+import pytest
+
+from Preprocessors.Helpers import dotted_lines_check as dotted
+
+
+def is_dotted(img, line, transition_threshold, regularity_threshold):
+    # The original one line at a time check, kept as the reference for classify_dotted_lines
+    x1, y1, x2, y2 = line  # Unpack the coordinates of the line
+    line_pixels = img[min(y1, y2):max(y1, y2), min(x1, x2):max(x1, x2)]
+
+    transitions = np.diff(line_pixels > 100).astype(np.int32)  # Calculate transition points (0->1 or 1->0)
+
+    # Count number of transitions
+    transition_count = np.sum(np.abs(transitions) > 0)
+
+    # Ensure the frequency of transitions is approximately equal
+    if transition_count > transition_threshold and np.std(np.diff(np.where(transitions != 0)[0])) < regularity_threshold:  # Check for regularity
+        return "Is Dotted Line"
+
+    if transition_count <= transition_threshold:
+        return "Not Enough Transitions"
+
+    if np.std(np.diff(np.where(transitions != 0)[0])) >= regularity_threshold:
+        return "Lines too Irregular"
+
+
+def hatched_page(rng, height=600, width=800):
+    # Dashed and solid strokes at random angles on a noisy white page
+    img = np.full((height, width), 255, np.uint8)
+    for _ in range(60):
+        x1, x2 = rng.integers(0, width, 2)
+        y1, y2 = rng.integers(0, height, 2)
+        cv2.line(img, (int(x1), int(y1)), (int(x2), int(y2)), int(rng.integers(0, 120)), int(rng.integers(1, 4)))
+    for _ in range(40):
+        x, y, step = int(rng.integers(0, width)), int(rng.integers(0, height)), int(rng.integers(4, 16))
+        for k in range(int(rng.integers(3, 20))):
+            cv2.line(img, (x + k * step, y), (x + k * step + step // 2, y + int(rng.integers(0, 3))), 0, 1)
+    noise = rng.random((height, width)) < 0.002
+    img[noise] = 0
+    return img
+
+
+def random_lines(rng, height, width, count=1500):
+    # Mostly short segments like Hough candidates, some running off the far edges
+    x1 = rng.integers(0, width + 20, count)
+    y1 = rng.integers(0, height + 20, count)
+    x2 = np.maximum(x1 + rng.integers(-200, 200, count), 0)
+    y2 = np.maximum(y1 + rng.integers(-200, 200, count), 0)
+    flat = rng.random(count) < 0.2
+    y2[flat] = y1[flat]
+    return np.column_stack([x1, y1, x2, y2])
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("thresholds", [(2, 10), (0, 10), (5, 3)])
+def test_classify_dotted_lines_matches_is_dotted(seed, thresholds):
+    rng = np.random.default_rng(seed)
+    img = hatched_page(rng)
+    lines = random_lines(rng, *img.shape)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # np.std of no differences
+        expected = [is_dotted(img, tuple(line), *thresholds) for line in lines]
+
+    assert dotted.classify_dotted_lines(img, lines, *thresholds) == expected
+    # Bands of a few rows give the same outcomes
+    assert dotted.classify_dotted_lines(img, lines, *thresholds, band_bytes=20000) == expected
+
+
+def test_classify_dotted_lines_empty():
+    assert dotted.classify_dotted_lines(np.zeros((10, 10), np.uint8), [], 2, 10) == []
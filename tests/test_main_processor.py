@@ -0,0 +1,98 @@
+import contextlib
+import io
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz
+import pytest
+
+import Processor.Main_processor as Main_processor
+from Preprocessors.BoundingBox_detector2 import NoPlanFound
+from Preprocessors.Helpers import stage_cache
+from Preprocessors.Page_raster import load_page_raster
+
+GREY = (0.6, 0.6, 0.6)
+
+
+def make_pdf(path, pages):
+    """
+    One page per entry: "plan" is a frame of grey beams around three slabs; "notes" is a
+    text page, "mark" a text page with a small grey square next to the text and "title" a
+    cover sheet with a grey title block, none of which holds a slab plan.
+    """
+    doc = fitz.open()
+    for kind in pages:
+        page = doc.new_page(width=500, height=360)
+        if kind == "plan":
+            for rect in (fitz.Rect(60, 40, 420, 300), fitz.Rect(60, 40, 240, 300), fitz.Rect(240, 40, 420, 170)):
+                page.draw_rect(rect, color=GREY, width=8)
+        elif kind == "title":
+            page.draw_rect(fitz.Rect(50, 130, 450, 230), color=GREY, fill=GREY)
+        else:
+            page.insert_text((72, 72), "General notes")
+            if kind == "mark":
+                page.draw_rect(fitz.Rect(72, 90, 76, 94), color=GREY, fill=GREY)
+    doc.save(str(path))
+
+
+@pytest.fixture(autouse=True)
+def no_stage_cache():
+    stage_cache.configure(None)
+
+
+def process(path, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return Main_processor.process_pdf(str(path), 0.005, pages="all", workers=1, output_dir=str(path.parent), open_output=False, **kwargs)
+
+
+@pytest.mark.parametrize("extraction", ["raster", "vector"])
+def test_pages_without_a_plan_are_reported(tmp_path, extraction):
+    path = tmp_path / "sheets.pdf"
+    make_pdf(path, ["notes", "plan", "mark", "title"])
+    output_path, failed_pages = process(path, extraction=extraction)
+    assert failed_pages == [
+        {"page": 1, "error": "No contours found in the image. Please check that you have uploaded the correct file."},
+        {"page": 3, "error": "No grey boxes big enough for a slab plan. Please check that you have uploaded the correct file."},
+        {"page": 4, "error": "No slabs found between the grey boxes. Please check that you have uploaded the correct file."},
+    ]
+    with fitz.open(output_path) as doc:
+        assert doc.page_count == 4
+
+
+def test_no_page_with_a_plan_raises(tmp_path):
+    path = tmp_path / "notes.pdf"
+    make_pdf(path, ["notes", "mark", "title"])
+    with pytest.raises(NoPlanFound):
+        process(path)
+    assert not list(tmp_path.glob("ANNOTATED*"))
+
+
+def test_other_errors_are_not_swallowed(tmp_path, monkeypatch):
+    path = tmp_path / "sheets.pdf"
+    make_pdf(path, ["plan", "plan"])
+
+    def broken(*args, **kwargs):
+        raise KeyError("bug")
+    monkeypatch.setattr(Main_processor, "analyse_page", broken)
+    with pytest.raises(KeyError):
+        process(path)
+
+
+def crash(*args, **kwargs):
+    os._exit(1)
+
+
+def test_crashed_direction_worker_does_not_break_the_next_page(tmp_path, monkeypatch):
+    path = tmp_path / "sheet.pdf"
+    make_pdf(path, ["plan"])
+    raster = load_page_raster(str(path))
+    monkeypatch.setattr(Main_processor, "CONCURRENT_MIN_SLABS", 0)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Main_processor, "reinforce_direction", crash)
+        with pytest.raises(BrokenProcessPool), contextlib.redirect_stdout(io.StringIO()):
+            Main_processor.analyse_page(raster, direction_workers=2)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        geometry = Main_processor.analyse_page(raster, direction_workers=2)
+    assert geometry["horizontal"] and geometry["vertical"]
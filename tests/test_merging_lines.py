@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from Preprocessors.Helpers import merging_lines as merge
+
+
+def efficient_merge_lines(lines, angle_thresh=5, dist_thresh=100):
+    # The original pairwise scan, kept as the reference for merge.efficient_merge_lines
+    if len(lines) == 0:
+        return []
+
+    used = [False] * len(lines)
+    merged = []
+
+    for i in range(len(lines)):
+        if used[i]:
+            continue
+        group = [lines[i][0]]
+        used[i] = True
+        for j in range(i+1, len(lines)):
+            if not used[j] and merge.lines_are_mergeable(merge.merge_line_group(group), lines[j][0], angle_thresh, dist_thresh):
+                group.append(lines[j][0])
+                used[j] = True
+        merged.append(merge.merge_line_group(group))
+    return merged
+
+
+def merge_all_colinear_lines(lines, angle_thresh=1, dist_thresh=5):
+    # The original pairwise scan, kept as the reference for merge.merge_all_colinear_lines
+    if len(lines) == 0:
+        return []
+
+    merged = []
+    used = [False] * len(lines)
+
+    for i in range(len(lines)):
+        if used[i]:
+            continue
+        group = [lines[i]]
+        used[i] = True
+        for j in range(i+1, len(lines)):
+            if not used[j] and merge.are_colinear_and_touching(lines[i], lines[j], angle_thresh, dist_thresh):
+                group.append(lines[j])
+                used[j] = True
+        # Merge all lines in the group into one
+        current = group[0]
+        for l in group[1:]:
+            current = merge.merge_lines_collinear(current, l)
+        merged.append(current)
+    return merged
+
+
+def hough_lines(rng, count, extent, length):
+    # Points, short stubs and near-horizontal/vertical segments, shaped like HoughLinesP output
+    points = rng.integers(0, extent, (count, 2))
+    steps = rng.integers(-length, length, (count, 2)) * rng.integers(0, 2, (count, 1))
+    axis = rng.integers(0, 3, count)
+    steps[axis == 0, 1] = rng.integers(-2, 3, (axis == 0).sum())
+    steps[axis == 1, 0] = rng.integers(-2, 3, (axis == 1).sum())
+    return np.concatenate([points, points + steps], 1).astype(np.int32).reshape(-1, 1, 4)
+
+
+@pytest.mark.parametrize("seed", range(15))
+def test_efficient_merge_lines_matches_pairwise_scan(seed):
+    rng = np.random.default_rng(seed)
+    lines = hough_lines(rng, int(rng.integers(1, 120)), 400, 150)
+    for dist_thresh in (7, 20, 100):
+        expected = efficient_merge_lines(lines, dist_thresh=dist_thresh)
+        assert repr(merge.efficient_merge_lines(lines, dist_thresh=dist_thresh)) == repr(expected)
+
+
+def test_efficient_merge_lines_empty():
+    assert merge.efficient_merge_lines([]) == []
+
+
+@pytest.mark.parametrize("seed", range(15))
+def test_merge_all_colinear_lines_matches_pairwise_scan(seed):
+    rng = np.random.default_rng(seed)
+    lines = hough_lines(rng, int(rng.integers(1, 150)), 200, 60)
+    # Merged lines are never points
+    lines = [list(line) for line in lines.reshape(-1, 4) if line[0] != line[2] or line[1] != line[3]]
+    for angle_thresh, dist_thresh in ((1, 5), (5, 20), (0, 5), (2.5, 7.5)):
+        expected = merge_all_colinear_lines(lines, angle_thresh, dist_thresh)
+        assert repr(merge.merge_all_colinear_lines(lines, angle_thresh, dist_thresh)) == repr(expected)
+
+
+def test_merge_all_colinear_lines_empty():
+    assert merge.merge_all_colinear_lines([]) == []
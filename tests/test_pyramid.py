@@ -0,0 +1,105 @@
+import contextlib
+import io
+
+import cv2
+import fitz
+import numpy as np
+import pytest
+
+import Preprocessors.BoundingBox_detector2 as bounding_box_detector
+import Preprocessors.Direction_marker_detector as Direction_marker_detector
+import sample_diagram_generator as generator
+from Preprocessors.Page_raster import load_page_raster
+
+FULL_REF = "./Preprocessors/image_references/reference_full.png"
+HALF_REF = "./Preprocessors/image_references/reference_half.png"
+
+
+def make_sheet(path, seed, thin_grey_line=False):
+    """
+    A generated A4 plan with direction markers on the left of an A3 sheet, with notes and a
+    title block on the right: the grey boxes only cover part of the page. thin_grey_line
+    runs a grey line too thin for the coarse pass from the plan out to the notes.
+    """
+    plan, _ = generator.generate_plan(seed, 6, 0.3, page_size="a4", markers=3)
+    doc = fitz.open()
+    width, height = fitz.paper_size("a3-l")
+    page = doc.new_page(width=width, height=height)
+    page.show_pdf_page(fitz.Rect(0, 0, 595, 842), plan, 0)
+    for i in range(20):
+        page.insert_text((700, 80 + 30 * i), f"Note {i}: all dimensions in millimetres")
+    page.draw_rect(fitz.Rect(650, 700, 1150, 820), color=(0, 0, 0), width=1)
+    if thin_grey_line:
+        page.draw_line((560, 400), (1150, 400), color=generator.beam_color, width=2)
+    doc.save(str(path))
+    plan.close()
+
+
+def bounding_boxes(path, pyramid):
+    # Each run on its own raster: the search paints over the page
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = bounding_box_detector.find_bounding_boxes(load_page_raster(str(path)), pyramid=pyramid)
+    return result, output.getvalue()
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_pyramid_finds_the_same_slabs(tmp_path, seed):
+    path = tmp_path / "sheet.pdf"
+    make_sheet(path, seed)
+
+    raster = load_page_raster(str(path))
+    img = raster.image
+    window = bounding_box_detector.locate_grey_window(img)
+    assert window is not None and window[2] < img.shape[1] // 2
+    assert bounding_box_detector.grey_contours_in_window(img, window) is not None
+
+    expected, _ = bounding_boxes(path, pyramid=False)
+    result, output = bounding_boxes(path, pyramid=True)
+    assert result == expected
+    assert "searching the whole page" not in output
+
+
+def test_pyramid_falls_back_to_the_whole_page(tmp_path):
+    path = tmp_path / "sheet.pdf"
+    make_sheet(path, 1, thin_grey_line=True)
+
+    raster = load_page_raster(str(path))
+    img = raster.image
+    window = bounding_box_detector.locate_grey_window(img)
+    # The line leaves the window, so the grey box mask inside it may not be the whole page's
+    assert bounding_box_detector.grey_contours_in_window(img, window) is None
+
+    expected, _ = bounding_boxes(path, pyramid=False)
+    result, output = bounding_boxes(path, pyramid=True)
+    assert result == expected
+    assert "searching the whole page" in output
+
+
+def test_no_grey_no_window():
+    assert bounding_box_detector.locate_grey_window(np.full((400, 600, 3), 255, np.uint8)) is None
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_pyramid_finds_the_same_direction_guides(tmp_path, seed):
+    path = tmp_path / "sheet.pdf"
+    make_sheet(path, seed)
+    raster = load_page_raster(str(path))
+    img = raster.image
+    full_ref, half_ref = cv2.imread(FULL_REF), cv2.imread(HALF_REF)
+
+    red_mask = Direction_marker_detector.pyramid_red_mask(img)
+    assert np.array_equal(red_mask, Direction_marker_detector.red_mask_of(img))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = Direction_marker_detector.detect_direction_guides(full_ref, half_ref, img.copy())
+        result = Direction_marker_detector.detect_direction_guides(full_ref, half_ref, img.copy(), red_mask)
+    assert result == expected
+    two_way, one_way = result
+    assert two_way and one_way
+
+
+def test_pyramid_red_mask_is_empty_without_red():
+    img = np.full((400, 600, 3), 255, np.uint8)
+    cv2.putText(img, "NOTES", (50, 200), cv2.FONT_HERSHEY_SIMPLEX, 3, (0, 0, 0), 5)
+    assert not Direction_marker_detector.pyramid_red_mask(img).any()
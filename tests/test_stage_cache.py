@@ -0,0 +1,145 @@
+import contextlib
+import glob
+import io
+import os
+import shutil
+
+import fitz
+import numpy as np
+import pytest
+
+from Preprocessors.Helpers import stage_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path):
+    stage_cache.configure(str(tmp_path / "cache"))
+    yield tmp_path / "cache"
+    stage_cache.configure(None)
+
+
+class Compute:
+    # Counts how often the stage actually runs
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.result
+
+
+def cached(key, stage, params, compute):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return stage_cache.cached(key, stage, params, compute)
+
+
+def make_pdf(path, text="General notes", pages=1):
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page(width=500, height=360)
+        page.insert_text((72, 72), f"{text} {number}")
+        page.draw_rect(fitz.Rect(60, 100, 420, 300), color=(0.6, 0.6, 0.6), width=8)
+    doc.save(str(path))
+
+
+SLABS = ([(np.int32(10), np.int32(20), np.int32(110), np.int32(220)), (110, 20, 300, 220)], (5, 15, 305, 225))
+DIRECTION_GUIDES = ([(1, 2, 3, 4)], [])
+
+
+@pytest.mark.parametrize("stage, result", [("slabs", SLABS), ("direction_guides", DIRECTION_GUIDES)])
+def test_hit_skips_compute_and_round_trips_the_result(stage, result):
+    compute = Compute(result)
+    first = cached("ab" + "0" * 62, stage, {"dpi": 300}, compute)
+    second = cached("ab" + "0" * 62, stage, {"dpi": 300}, compute)
+
+    assert compute.calls == 1
+    assert first is result
+    boxes, other = second
+    assert boxes == [tuple(int(v) for v in box) for box in result[0]]
+    assert other == (tuple(result[1]) if stage == "slabs" else [])
+    assert all(type(v) is int for box in boxes for v in box)
+
+
+def test_changing_a_param_misses():
+    compute = Compute(DIRECTION_GUIDES)
+    key = "cd" + "0" * 62
+    cached(key, "voids", {"roi": (0, 0, 10, 10), "void_tile_size": None}, compute)
+    cached(key, "voids", {"roi": (0, 0, 10, 11), "void_tile_size": None}, compute)
+    cached(key, "voids", {"roi": (0, 0, 10, 10), "void_tile_size": 4096}, compute)
+    cached(key, "direction_guides", {"roi": (0, 0, 10, 10), "void_tile_size": None}, compute)
+    assert compute.calls == 4
+    cached(key, "voids", {"roi": (0, 0, 10, 11), "void_tile_size": None}, compute)
+    assert compute.calls == 4
+
+
+def test_changing_the_code_misses(monkeypatch):
+    compute = Compute(DIRECTION_GUIDES)
+    key = "ef" + "0" * 62
+    cached(key, "slabs", {"dpi": 300}, compute)
+    monkeypatch.setattr(stage_cache, "_code_version", "another version")
+    cached(key, "slabs", {"dpi": 300}, compute)
+    assert compute.calls == 2
+
+
+def test_code_version_is_stable():
+    assert stage_cache.code_version() == stage_cache.code_version()
+    assert len(stage_cache.code_version()) == 16
+
+
+def test_page_key_follows_the_page_content(tmp_path):
+    make_pdf(tmp_path / "plan.pdf", pages=2)
+    key = stage_cache.page_key(str(tmp_path / "plan.pdf"), 0)
+
+    # Independent of the file name and of the other pages
+    shutil.copy(tmp_path / "plan.pdf", tmp_path / "copy.pdf")
+    assert stage_cache.page_key(str(tmp_path / "copy.pdf"), 0) == key
+    with fitz.open(str(tmp_path / "plan.pdf")) as doc:
+        doc[1].insert_text((72, 200), "Revision B")
+        doc.save(str(tmp_path / "other_page_edited.pdf"))
+    assert stage_cache.page_key(str(tmp_path / "other_page_edited.pdf"), 0) == key
+
+    assert stage_cache.page_key(str(tmp_path / "plan.pdf"), 1) != key
+    make_pdf(tmp_path / "edited.pdf", text="Revision B", pages=2)
+    assert stage_cache.page_key(str(tmp_path / "edited.pdf"), 0) != key
+    with fitz.open(str(tmp_path / "plan.pdf")) as doc:
+        doc[0].set_rotation(90)
+        doc.save(str(tmp_path / "rotated.pdf"))
+    assert stage_cache.page_key(str(tmp_path / "rotated.pdf"), 0) != key
+
+
+def test_changing_the_page_misses(tmp_path):
+    make_pdf(tmp_path / "plan.pdf")
+    make_pdf(tmp_path / "edited.pdf", text="Revision B")
+    compute = Compute(SLABS)
+    for name in ("plan.pdf", "edited.pdf", "plan.pdf"):
+        cached(stage_cache.page_key(str(tmp_path / name), 0), "slabs", {"dpi": 300}, compute)
+    assert compute.calls == 2
+
+
+def test_truncated_entry_is_ignored(cache_dir):
+    compute = Compute(SLABS)
+    key = "12" + "0" * 62
+    cached(key, "slabs", {"dpi": 300}, compute)
+    (path,) = glob.glob(os.path.join(str(cache_dir), "**", "slabs-*.json"), recursive=True)
+    with open(path) as f:
+        text = f.read()
+    with open(path, "w") as f:
+        f.write(text[:len(text) // 2])
+
+    result = cached(key, "slabs", {"dpi": 300}, compute)
+    assert compute.calls == 2
+    assert result is SLABS
+    # and replaced by a complete one
+    cached(key, "slabs", {"dpi": 300}, compute)
+    assert compute.calls == 2
+
+
+def test_no_key_or_no_directory_always_computes():
+    compute = Compute(SLABS)
+    cached(None, "slabs", {"dpi": 300}, compute)
+    cached(None, "slabs", {"dpi": 300}, compute)
+    stage_cache.configure(None)
+    cached("34" + "0" * 62, "slabs", {"dpi": 300}, compute)
+    cached("34" + "0" * 62, "slabs", {"dpi": 300}, compute)
+    assert compute.calls == 4
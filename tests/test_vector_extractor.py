@@ -0,0 +1,91 @@
+import contextlib
+import io
+
+import fitz
+import pytest
+
+import Preprocessors.BoundingBox_detector2 as BoundingBox_detector2
+from Preprocessors.Page_raster import load_page_raster
+from Preprocessors.Vector_extractor import find_bounding_boxes_vector
+
+GREY = (0.6, 0.6, 0.6)
+# Vector boxes sit a few pixels off the raster ones (antialiasing and the mask morphology)
+TOLERANCE = 6
+
+
+def make_plan(path, rotation=0, cropbox=None, drawn_with_lines=False, slanted=False):
+    # A frame of grey beams split into three slabs, with a black column where the beams meet
+    doc = fitz.open()
+    page = doc.new_page(width=500, height=360)
+    shape = page.new_shape()
+    if drawn_with_lines:
+        # Beam outlines as filled polylines: an L, a T, and two straight beams
+        polygons = [
+            [(56, 36), (424, 36), (424, 44), (64, 44), (64, 304), (56, 304)],
+            [(416, 44), (424, 44), (424, 304), (416, 304)],
+            [(64, 296), (416, 296), (416, 304), (64, 304)],
+            [(64, 166), (416, 166), (416, 174), (244, 174), (244, 296), (236, 296), (236, 174), (64, 174)],
+        ]
+        for points in polygons:
+            shape.draw_polyline(points)
+            shape.finish(fill=GREY, color=None, closePath=True)
+        shape.draw_polyline([(236, 166), (250, 166), (250, 180), (236, 180)])
+        shape.finish(fill=(0, 0, 0), color=None, closePath=True)
+    else:
+        for rect in (fitz.Rect(60, 40, 420, 300), fitz.Rect(60, 40, 240, 300), fitz.Rect(240, 40, 420, 170)):
+            shape.draw_rect(rect)
+            shape.finish(color=GREY, width=8)
+        shape.draw_rect(fitz.Rect(236, 166, 250, 180))
+        shape.finish(color=(0, 0, 0), fill=(0, 0, 0))
+    if slanted:
+        shape.draw_polyline([(300, 60), (340, 60), (320, 100)])
+        shape.finish(fill=GREY, color=None, closePath=True)
+    shape.commit()
+    if cropbox is not None:
+        page.set_cropbox(cropbox)
+    page.set_rotation(rotation)
+    doc.save(path)
+
+
+def find_both(path):
+    raster = load_page_raster(str(path))
+    with contextlib.redirect_stdout(io.StringIO()):
+        raster_found = BoundingBox_detector2.find_bounding_boxes(raster)
+        with fitz.open(str(path)) as doc:
+            vector_found = find_bounding_boxes_vector(doc[0], raster.dpi)
+    return raster_found, vector_found
+
+
+def assert_close(box, expected):
+    assert all(abs(a - b) <= TOLERANCE for a, b in zip(box, expected)), (box, expected)
+
+
+def assert_same_slabs(raster_found, vector_found):
+    assert vector_found is not None
+    (raster_boxes, raster_enclosure), (vector_boxes, vector_enclosure) = raster_found, vector_found
+    assert_close(vector_enclosure, raster_enclosure)
+    assert len(vector_boxes) == len(raster_boxes) == 3
+    for vector_box, raster_box in zip(sorted(vector_boxes), sorted(raster_boxes)):
+        assert_close(vector_box, raster_box)
+
+
+@pytest.mark.parametrize("rotation", [0, 90, 180, 270])
+@pytest.mark.parametrize("cropbox", [None, fitz.Rect(20, 10, 480, 340)])
+def test_rotated_and_cropped_pages_match_raster(tmp_path, rotation, cropbox):
+    path = tmp_path / "plan.pdf"
+    make_plan(path, rotation, cropbox)
+    assert_same_slabs(*find_both(path))
+
+
+@pytest.mark.parametrize("rotation", [0, 90])
+def test_fills_drawn_with_lines_match_raster(tmp_path, rotation):
+    path = tmp_path / "plan.pdf"
+    make_plan(path, rotation, drawn_with_lines=True)
+    assert_same_slabs(*find_both(path))
+
+
+def test_slanted_fill_falls_back_to_raster(tmp_path):
+    path = tmp_path / "plan.pdf"
+    make_plan(path, drawn_with_lines=True, slanted=True)
+    _, vector_found = find_both(path)
+    assert vector_found is None
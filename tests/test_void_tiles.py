@@ -0,0 +1,98 @@
+import contextlib
+import io
+
+import pytest
+
+import Preprocessors.BoundingBox_detector2 as bounding_box_detector
+import Preprocessors.Void_box_detector as Void_box_detector
+import sample_diagram_generator as generator
+from Preprocessors.Page_raster import load_page_raster
+
+# find_voids_tiled at the default tile size against find_voids, in pixels
+TOLERANCE = 8
+
+
+@pytest.fixture(scope="module", params=[1, 2])
+def plan(request, tmp_path_factory):
+    # An A3 plan: two tiles of the default size, one seam across the plan
+    doc, _ = generator.generate_plan(request.param, 12, 0.5, page_size="a3")
+    path = str(tmp_path_factory.mktemp("plans") / f"plan{request.param}.pdf")
+    doc.save(path)
+    doc.close()
+
+    raster = load_page_raster(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, (x1, y1, x2, y2) = bounding_box_detector.find_bounding_boxes(raster)
+        roi = ((x1, y1), (x2, y2))
+        voids = Void_box_detector.find_voids(raster.image, roi, detect_mediums=True)
+    return raster, roi, sorted(tuple(int(v) for v in box) for box in voids)
+
+
+def tiled(raster, roi, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        voids = Void_box_detector.find_voids_tiled(raster.image, roi, detect_mediums=True, workers=1, **kwargs)
+    return sorted(tuple(int(v) for v in box) for box in voids)
+
+
+def overlap_ratio(a, b):
+    # Intersection over union of two (x1, y1, x2, y2) boxes
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0
+    area = lambda box: (box[2] - box[0]) * (box[3] - box[1])
+    return width * height / (area(a) + area(b) - width * height)
+
+
+def test_tiled_voids_match_the_whole_plan(plan):
+    raster, roi, expected = plan
+    assert len(Void_box_detector.void_tiles(roi)) == 2
+    voids = tiled(raster, roi)
+
+    assert len(voids) == len(expected)
+    for void, box in zip(voids, expected):
+        assert max(abs(a - b) for a, b in zip(void, box)) <= TOLERANCE
+
+
+def test_voids_split_across_a_seam_are_joined(plan, monkeypatch):
+    raster, roi, expected = plan
+    joined = []
+    reconcile_tile_voids = Void_box_detector.reconcile_tile_voids
+
+    def reconcile(tile_voids):
+        voids = reconcile_tile_voids(tile_voids)
+        joined.append(sum(len(boxes) for boxes in tile_voids) - len(voids))
+        return voids
+    monkeypatch.setattr(Void_box_detector, "reconcile_tile_voids", reconcile)
+
+    # Tiles with an overlap smaller than the voids, so some are only seen in parts
+    voids = tiled(raster, roi, tile_size=512, overlap=128)
+
+    assert joined[0] > 0
+    assert len(voids) == len(expected)
+    for box in expected:
+        assert max(overlap_ratio(void, box) for void in voids) > 0.5
+
+
+def test_tiles_cover_the_roi_once():
+    roi = ((100, 50), (1300, 1000))
+    tiles = Void_box_detector.void_tiles(roi, tile_size=500, overlap=100)
+    assert [core for core, _ in tiles] == [
+        ((100, 50), (600, 550)), ((600, 50), (1100, 550)), ((1100, 50), (1300, 550)),
+        ((100, 550), (600, 1000)), ((600, 550), (1100, 1000)), ((1100, 550), (1300, 1000)),
+    ]
+    # Grown by the overlap, clipped to the roi
+    assert tiles[0][1] == ((100, 50), (700, 650))
+    assert tiles[4][1] == ((500, 450), (1200, 1000))
+
+
+def test_reconcile_joins_across_tiles_only():
+    tile_voids = [
+        [(0, 0, 120, 40), (10, 100, 50, 140), (30, 110, 70, 150)],
+        [(100, 0, 260, 40)],
+        [(400, 400, 450, 450)],
+    ]
+    assert Void_box_detector.reconcile_tile_voids(tile_voids) == [
+        (0, 0, 260, 40), (10, 100, 50, 140), (30, 110, 70, 150), (400, 400, 450, 450),
+    ]
+    assert Void_box_detector.reconcile_tile_voids([[], []]) == []